@@ -0,0 +1,212 @@
+import asyncio
+import io
+import threading
+import time
+from governor import Governor, Limits
+from interpreter import MAX_CALL_DEPTH
+from lox_token import Token
+from server import ServerLox
+
+# Runs many lox scripts concurrently under asyncio, each in a session taking turns with the others
+#
+#     runner = AsyncLox()
+#     results = await asyncio.gather(*(runner.run(source) for source in sources))
+#
+# The engines are recursive python code that cannot be suspended halfway through a script, so every session runs
+# in a thread of its own; the threads only take turns: a session runs until it used up its slice of steps (loop
+# iterations and calls), hands the turn back to the event loop and waits to be resumed. A session waiting in a
+# blocking native like sleep() hands the turn back too, and the event loop resumes it once the wait is over, so
+# scripts that wait overlap their waits while scripts that only compute get done no faster than one after another
+
+# steps a session runs before letting the next one have its turn
+SLICE_STEPS = 1000
+# sessions whose thread is alive at once, the others wait for one of them to finish before starting
+MAX_SESSIONS = 1000
+
+YIELDED = 'yielded'
+WAITING = 'waiting'
+DONE = 'done'
+
+
+class SessionCancelled(BaseException):
+    """ Unwinds the thread of a cancelled session, a BaseException so that nothing in the interpreter catches it """
+
+
+class SessionGovernor(Governor):
+    """ Enforces the limits of a session, and ends its turn each time its slice of steps is used up """
+
+    def __init__(self, limits: Limits, session: 'Session'):
+        super().__init__(limits, session.slice_steps)
+        self.session = session
+
+    def check(self, token: Token) -> int:
+        interval = super().check(token)
+        self.session.pause()
+        return interval
+
+
+class SessionLox(ServerLox):
+    def __init__(self, session: 'Session', *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = session
+
+    def start_run(self, limits: Limits | None):
+        self.governor = SessionGovernor(limits or self.limits or Limits(), self.session)
+
+    def wait(self, seconds: float):
+        self.session.wait(seconds)
+
+
+class Session:
+    """
+        One lox script with its own interpreter, globals and output, run in a thread that only runs while it has
+        the turn; the event loop side is AsyncLox.run
+    """
+
+    def __init__(self, source: str, engine: str, max_call_depth: int, limits: Limits | None, slice_steps: int, output):
+        self.source = source
+        self.slice_steps = slice_steps
+        self.lox = SessionLox(self, engine, max_call_depth=max_call_depth, limits=limits)
+        self.output = io.StringIO() if output is None else output
+        self.lox.interpreter.output = self.output
+        self.turn = threading.Event()  # set while the session may run
+        self.cancelled = False
+        self.waiting = 0.0  # seconds the session asked to wait for when it last gave the turn back WAITING
+        self.crash = None  # exception that escaped the interpreter
+        self.seconds = 0.0  # time spent running, turns of other sessions excluded
+        self.loop = None
+        self.future = None  # resolved by the thread with YIELDED or DONE when it gives the turn back
+        self.resumed = 0.0  # when the session last got the turn
+        self.thread = threading.Thread(target=self.main, daemon=True)
+
+    def main(self):
+        self.turn.wait()
+        try:
+            if not self.cancelled:
+                self.lox.run(self.source)
+        except SessionCancelled:
+            pass
+        except Exception as error:  # a bug in the interpreter fails this session only
+            self.crash = error
+        finally:
+            self.seconds += time.perf_counter() - self.resumed
+            self.signal(DONE)
+
+    def pause(self):
+        """ Called by the session's thread between two steps: gives the turn back and waits to get it again """
+        self.give_turn(YIELDED)
+
+    def wait(self, seconds: float):
+        """ Called by the session's thread in a blocking native: lets other sessions run for seconds meanwhile """
+        self.waiting = seconds
+        self.give_turn(WAITING)
+
+    def give_turn(self, state: str):
+        if self.cancelled:
+            raise SessionCancelled()
+        self.seconds += time.perf_counter() - self.resumed
+        governor = self.lox.governor
+        governor.pause()  # what the other sessions allocate is not charged to this one
+        try:
+            self.turn.clear()
+            self.signal(state)
+            self.turn.wait()
+            if self.cancelled:
+                raise SessionCancelled()
+        finally:
+            governor.resume()
+
+    def signal(self, state: str):
+        future = self.future
+        try:
+            self.loop.call_soon_threadsafe(lambda: future.done() or future.set_result(state))
+        except RuntimeError:
+            pass  # the event loop was closed, nobody is waiting for the session anymore
+
+    def resume(self) -> asyncio.Future:
+        """ Gives the session the turn, the future resolves once it gives it back """
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.resumed = time.perf_counter()
+        if not self.thread.is_alive() and not self.thread.ident:
+            self.thread.start()
+        self.turn.set()
+        return self.future
+
+    async def unwind(self):
+        """
+            Cancels the session and waits for its thread to end, which it does at its next step or as soon as it is
+            resumed when it is waiting; the caller holds the turn until then, so no other session runs meanwhile
+        """
+        self.cancelled = True
+        state = None
+        while state != DONE:
+            try:
+                state = await self.resume()
+            except asyncio.CancelledError:
+                pass  # cancelled again, the thread still has to end before the turn is given to another session
+
+    def result(self) -> dict:
+        lox = self.lox
+        if self.crash is not None:
+            status = 'internal_error'
+            lox.errors.append(f'{self.crash.__class__.__name__}: {self.crash}')
+        elif self.cancelled:
+            status = 'cancelled'
+        elif lox.had_error:
+            status = 'compile_error'
+        elif lox.limit_exceeded:
+            status = 'limit_exceeded'
+        elif lox.had_runtime_error:
+            status = 'runtime_error'
+        else:
+            status = 'ok'
+        result = {'status': status, 'seconds': self.seconds, 'errors': lox.errors,
+                  'usage': lox.governor.usage() if lox.governor is not None else None}
+        if isinstance(self.output, io.StringIO):
+            result['output'] = self.output.getvalue()
+        return result
+
+
+class AsyncLox:
+    """
+        Schedules sessions round robin: a session waits for the turn in a FIFO queue, runs one slice of steps
+        and queues up again, so a short script gets through while long ones are still running
+    """
+
+    def __init__(self, engine: str = 'tree', max_call_depth: int = MAX_CALL_DEPTH, limits: Limits | None = None,
+                 slice_steps: int = SLICE_STEPS, max_sessions: int = MAX_SESSIONS):
+        self.engine = engine
+        self.max_call_depth = max_call_depth
+        self.limits = limits
+        self.slice_steps = slice_steps
+        self.max_sessions = max_sessions
+        self.turn = None  # asyncio.Lock handing the turn out in the order it was asked for
+        self.slots = None  # asyncio.Semaphore of the sessions that may have a thread
+
+    async def run(self, source: str, output=None, limits: Limits | None = None) -> dict:
+        """
+            Runs source in a new session and returns its status, errors, running time and resource usage,
+            plus what it printed unless output, a file, was given to print to. Cancelling the task stops the session
+        """
+        if self.turn is None:
+            self.turn = asyncio.Lock()
+            self.slots = asyncio.Semaphore(self.max_sessions)
+        async with self.slots:
+            session = Session(source, self.engine, self.max_call_depth, limits or self.limits, self.slice_steps, output)
+            state = YIELDED
+            while state != DONE:
+                if state == WAITING:
+                    try:
+                        await asyncio.sleep(session.waiting)
+                    except asyncio.CancelledError:
+                        async with self.turn:
+                            await session.unwind()
+                        raise
+                async with self.turn:
+                    try:
+                        state = await session.resume()
+                    except asyncio.CancelledError:
+                        await session.unwind()
+                        raise
+            return session.result()
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from interpreter import MAX_CALL_DEPTH
+from main import ENGINES
+from server import run_script
+from governor import Limits
+
+# Runs many independent lox scripts across a pool of worker processes and reports how each one went
+# usage: python3 batch.py FILE_OR_DIRECTORY... [--workers N] [--engine NAME] [--json FILE] [--show-output]
+# Exits with status 1 when any script failed
+
+WARM_UP = 'fun f(n) { return n; } class C { init() { this.x = f(1); } } print C().x;'
+
+worker_engine = 'tree'
+worker_max_call_depth = MAX_CALL_DEPTH
+worker_limits = None
+
+
+def warm_up(engine: str, max_call_depth: int, limits: Limits | None):
+    """ Runs in each worker as it starts, so the imports and a first run are paid once per worker, not per script """
+    global worker_engine, worker_max_call_depth, worker_limits
+    worker_engine = engine
+    worker_max_call_depth = max_call_depth
+    worker_limits = limits
+    run_script(WARM_UP, engine, max_call_depth)
+
+
+def run_file(path: str) -> dict:
+    try:
+        with open(path) as f:
+            source = f.read()
+    except (OSError, ValueError) as error:
+        return {'path': path, 'status': 'bad_request', 'seconds': 0.0, 'output': '', 'errors': [str(error)]}
+    return {'path': path, **run_script(source, worker_engine, worker_max_call_depth, limits=worker_limits)}
+
+
+def collect_scripts(paths: list[str]) -> list[str]:
+    """ The given files, and the .lox files anywhere under the given directories, in sorted order """
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                scripts.extend(os.path.join(directory, name) for name in names if name.endswith('.lox'))
+        else:
+            scripts.append(path)
+    return sorted(scripts)
+
+
+def run_batch(scripts: list[str], workers: int | None = None, engine: str = 'tree',
+              max_call_depth: int = MAX_CALL_DEPTH, limits: Limits | None = None) -> list[dict]:
+    """ Results of running each script, in the order of scripts """
+    if not scripts:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(scripts))
+    # several scripts per task keeps the cost of handing work to the workers small next to short scripts
+    chunk_size = max(1, len(scripts) // (workers * 4))
+    with ProcessPoolExecutor(workers, initializer=warm_up, initargs=(engine, max_call_depth, limits)) as executor:
+        return list(executor.map(run_file, scripts, chunksize=chunk_size))
+
+
+def print_report(results: list[dict], wall_seconds: float, show_output: bool, file):
+    width = max(len(result['path']) for result in results)
+    for result in results:
+        print(f'{result["path"]:<{width}}  {result["status"]:<14} {result["seconds"]:>9.4f} s', file=file)
+        for error in result['errors']:
+            print(f'    {error}', file=file)
+        if show_output and result['output']:
+            for line in result['output'].splitlines():
+                print(f'    | {line}', file=file)
+
+    statuses = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+    cpu_seconds = sum(result['seconds'] for result in results)
+    counts = ', '.join(f'{count} {status}' for status, count in sorted(statuses.items()))
+    print(f'\n{len(results)} scripts: {counts}', file=file)
+    print(f'{cpu_seconds:.3f} s running scripts, {wall_seconds:.3f} s wall time', file=file)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Run lox scripts in parallel')
+    arg_parser.add_argument('paths', nargs='+', help='lox scripts, or directories searched for .lox files')
+    arg_parser.add_argument('--workers', type=int, help='worker processes (default: one per cpu)')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), default='tree', help='execution engine (default: tree)')
+    arg_parser.add_argument('--max-depth', type=int, default=MAX_CALL_DEPTH,
+                            help=f'deepest chain of calls before a stack overflow error (default: {MAX_CALL_DEPTH})')
+    arg_parser.add_argument('--max-steps', type=int, help='stop a script after this many loop iterations and calls')
+    arg_parser.add_argument('--timeout', type=float, help='stop a script after running this many seconds')
+    arg_parser.add_argument('--json', metavar='FILE', help='also write every result, output included, as JSON')
+    arg_parser.add_argument('--show-output', action='store_true', help='print what each script printed')
+    args = arg_parser.parse_args()
+
+    scripts = collect_scripts(args.paths)
+    if not scripts:
+        arg_parser.error('no .lox files found')
+    start = time.perf_counter()
+    limits = Limits(steps=args.max_steps, timeout=args.timeout)
+    results = run_batch(scripts, args.workers, args.engine, args.max_depth, limits)
+    print_report(results, time.perf_counter() - start, args.show_output, sys.stdout)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if any(result['status'] != 'ok' for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Measures running many small lox scripts as concurrent asyncio sessions against running them one after another,
+# how long a short script waits when it arrives behind long ones, and scripts that mostly wait in sleep()
+# usage: python3 benchmarks/async_sessions.py [--sessions N] [--engine NAME]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SMALL = '''
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+print fib(12);
+'''
+
+LONG = '''
+var sum = 0;
+for (var i = 0; i < 100000; i = i + 1) sum = sum + i;
+print sum;
+'''
+
+# stands for a script waiting on something outside the interpreter, sessions hand the turn over while it waits
+WAITING = '''
+var total = 0;
+for (var i = 0; i < 5; i = i + 1) {
+  sleep(0.01);
+  total = total + i;
+}
+print total;
+'''
+
+
+async def concurrent(runner, sources: list[str]) -> float:
+    """ Seconds until every script finished, all of them started at once """
+    start = time.perf_counter()
+    results = await asyncio.gather(*(runner.run(source) for source in sources))
+    if any(result['status'] != 'ok' for result in results):
+        raise SystemExit('benchmark program failed')
+    return time.perf_counter() - start
+
+
+async def concurrent_latency(runner, long_count: int) -> float:
+    """ Seconds a small script takes to finish when it is started right after long_count long ones """
+    start = time.perf_counter()
+    long_tasks = [asyncio.create_task(runner.run(LONG)) for _ in range(long_count)]
+    await runner.run(SMALL)
+    latency = time.perf_counter() - start
+    await asyncio.gather(*long_tasks)
+    return latency
+
+
+def sequential(engine: str, sources: list[str]) -> float:
+    from server import run_script
+
+    start = time.perf_counter()
+    for source in sources:
+        run_script(source, engine)
+    return time.perf_counter() - start
+
+
+def main():
+    from main import ENGINES
+    from async_lox import AsyncLox
+
+    arg_parser = argparse.ArgumentParser(description='Concurrent asyncio sessions benchmark')
+    arg_parser.add_argument('--sessions', type=int, default=500, help='small scripts run for the throughput')
+    arg_parser.add_argument('--long', type=int, default=4, help='long scripts ahead of the small one for the latency')
+    arg_parser.add_argument('--waiting', type=int, default=100, help='scripts that mostly sleep run for the throughput')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), action='append', help='engine to measure, all by default')
+    args = arg_parser.parse_args()
+
+    for engine in args.engine or ENGINES.keys():
+        sources = [SMALL] * args.sessions
+        one_at_a_time = sequential(engine, sources)
+        together = asyncio.run(concurrent(AsyncLox(engine), sources))
+        print(f'{engine:<8} {args.sessions} small scripts: one at a time {one_at_a_time:.3f} s '
+              f'({args.sessions / one_at_a_time:,.0f}/s), as sessions {together:.3f} s ({args.sessions / together:,.0f}/s)')
+
+        waiting = sequential(engine, [LONG] * args.long + [SMALL])
+        latency = asyncio.run(concurrent_latency(AsyncLox(engine), args.long))
+        print(f'{engine:<8} small script behind {args.long} long ones: done after {waiting:.3f} s one at a time, '
+              f'{latency:.3f} s as sessions')
+
+        sources = [WAITING] * args.waiting
+        one_at_a_time = sequential(engine, sources)
+        together = asyncio.run(concurrent(AsyncLox(engine), sources))
+        print(f'{engine:<8} {args.waiting} waiting scripts: one at a time {one_at_a_time:.3f} s '
+              f'({args.waiting / one_at_a_time:,.0f}/s), as sessions {together:.3f} s ({args.waiting / together:,.0f}/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+
+# Measures the cost of lox function calls and returns on recursive programs, for each engine
+# usage: python3 benchmarks/call_return.py [--fib N] [--depth N] [--engine NAME]
+# Run it on two checkouts to compare a change before and after
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parse_memory import best_time
+from instance_layout import run
+
+# every call returns through a nested if, so the return unwinds through a block
+FIB = '''
+fun fib(n) {
+  if (n < 2) {
+    return n;
+  }
+  return fib(n - 2) + fib(n - 1);
+}
+fib(%d);
+'''
+
+# deep recursion, repeated, with the return at the bottom of a loop body
+DEEP = '''
+fun down(n) {
+  while (true) {
+    if (n == 0) return 0;
+    return down(n - 1) + 1;
+  }
+}
+for (var i = 0; i < %d; i = i + 1) down(%d);
+'''
+
+
+def fib_calls(n: int) -> int:
+    calls = [1, 1]
+    for i in range(2, n + 1):
+        calls.append(calls[i - 1] + calls[i - 2] + 1)
+    return calls[n]
+
+
+def main():
+    from main import ENGINES
+    from interpreter import MAX_CALL_DEPTH
+
+    arg_parser = argparse.ArgumentParser(description='Function call / return benchmark')
+    arg_parser.add_argument('--fib', type=int, default=22, help='argument of the recursive fib')
+    arg_parser.add_argument('--depth', type=int, default=5000,
+                            help=f'recursion depth of the deep calls, below the max call depth of {MAX_CALL_DEPTH}')
+    arg_parser.add_argument('--rounds', type=int, default=3, help='how many times the deep recursion runs')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions, the best one is reported')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), action='append', help='engine to measure, all by default')
+    args = arg_parser.parse_args()
+
+    programs = [
+        (f'fib({args.fib})', FIB % args.fib, fib_calls(args.fib)),
+        (f'depth {args.depth} x {args.rounds}', DEEP % (args.rounds, args.depth), (args.depth + 1) * args.rounds),
+    ]
+    for engine in args.engine or ENGINES.keys():
+        for name, source, calls in programs:
+            seconds = best_time(lambda: run(engine, source), args.repeat)
+            print(f'{engine:<8} {name:<18} {seconds:.3f} s  ({calls / seconds:,.0f} calls/s)')
+
+
+if __name__ == '__main__':
+    main()
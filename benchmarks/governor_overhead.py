@@ -0,0 +1,98 @@
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+import timeit
+
+# Measures what enforcing resource limits costs, on the programs of the benchmark suite, for each engine
+# usage: python3 benchmarks/governor_overhead.py [--repeat N] [--engine NAME] [--program NAME]
+# Every program runs without limits and with limits too high to be reached, the difference is the cost of the
+# checks; run it on two checkouts to also see what the countdown costs runs that have no limits
+# The runs of both sides are interleaved, so that a slow spell of the machine does not land on one side only, and
+# the overhead is given on the min and on the median of the runs. Both swing by several percent from run to run on a
+# busy machine, so the last column gives what the checks of a run cost: their number times the time of one check,
+# against the median run without limits
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suite import PROGRAMS
+
+# every limit is checked, none is ever reached
+LIMITS = {'steps': 10 ** 12, 'timeout': 3600.0, 'allocations': 10 ** 12, 'memory': 1 << 40}
+
+
+def run(engine: str, source: str, limits) -> tuple[float, int]:
+    """ Seconds taken by one run on a new interpreter, and the steps it took when it had limits """
+    from main import Lox
+
+    lox = Lox(engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        lox.run(source, limits)
+        seconds = time.perf_counter() - start
+    if lox.had_error or lox.had_runtime_error:
+        print(f'benchmark program failed on the {engine} engine')
+        sys.exit(1)
+    return seconds, lox.governor.usage()['steps'] if limits else 0
+
+
+def check_time() -> float:
+    """ Seconds a check of every limit takes """
+    from governor import CHECK_INTERVAL, Governor, Limits
+    from interpreter import Interpreter
+
+    governor = Governor(Limits(**LIMITS))
+    governor.attach(Interpreter(None))
+    number = 10000
+    # check() hands out CHECK_INTERVAL more steps each time, the step limit is never reached
+    return timeit.timeit(lambda: governor.check(None), number=number) / number
+
+
+def overhead(free: float, limited: float) -> str:
+    return f'{100 * (limited - free) / free:+.1f}%'
+
+
+def main():
+    from main import ENGINES
+    from governor import Limits
+
+    programs = sorted(name[:-len('.lox')] for name in os.listdir(PROGRAMS) if name.endswith('.lox'))
+    arg_parser = argparse.ArgumentParser(description='Resource limit overhead benchmark')
+    arg_parser.add_argument('--repeat', type=int, default=15, help='runs of each side, min and median are reported')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), action='append', help='engine to measure, all by default')
+    arg_parser.add_argument('--program', choices=programs, action='append', help='program to run, all by default')
+    args = arg_parser.parse_args()
+
+    from governor import CHECK_INTERVAL
+
+    check = check_time()
+    print(f'one check of every limit takes {check * 1e6:.1f} us, one every {CHECK_INTERVAL} steps')
+    print(f'{"program":<20} {"engine":<8} {"no limits min":>13} {"median":>8} {"limits min":>10} {"median":>8} '
+          f'{"overhead min":>12} {"median":>8} {"checks":>7}')
+    for program in args.program or programs:
+        with open(os.path.join(PROGRAMS, program + '.lox')) as f:
+            source = f.read()
+        for engine in args.engine or ENGINES.keys():
+            free, limited = [], []
+            steps = 0
+            for i in range(args.repeat):
+                # which side goes first alternates too, the second run of a pair finds warmer caches
+                for limits in ((None, Limits(**LIMITS)) if i % 2 == 0 else (Limits(**LIMITS), None)):
+                    seconds, used = run(engine, source, limits)
+                    if limits:
+                        limited.append(seconds)
+                        steps = used
+                    else:
+                        free.append(seconds)
+            free_median, limited_median = statistics.median(free), statistics.median(limited)
+            print(f'{program:<20} {engine:<8} {min(free):>13.4f} {free_median:>8.4f} {min(limited):>10.4f} '
+                  f'{limited_median:>8.4f} {overhead(min(free), min(limited)):>12} '
+                  f'{overhead(free_median, limited_median):>8} '
+                  f'{100 * steps / CHECK_INTERVAL * check / free_median:>+6.2f}%')
+
+
+if __name__ == '__main__':
+    main()
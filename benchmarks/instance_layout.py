@@ -0,0 +1,94 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tracemalloc
+
+# Measures the memory held per instance and the speed of field reads and writes, for each engine
+# usage: python3 benchmarks/instance_layout.py [--instances N] [--accesses N] [--engine NAME]
+# Run it on two checkouts to compare a change before and after
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parse_memory import best_time
+
+# keeps every record alive through the 'prev' chain, ids are small so their numbers are shared constants
+RECORDS = '''
+class Record {
+  init(prev) {
+    this.id = 1;
+    this.name = "record";
+    this.value = 2;
+    this.prev = prev;
+  }
+}
+var head = nil;
+for (var i = 0; i < %d; i = i + 1) {
+  head = Record(head);
+}
+'''
+
+# 4 field reads and 3 field writes per iteration
+ACCESSES = '''
+class Point {
+  init() {
+    this.x = 0;
+    this.y = 0;
+    this.z = 0;
+  }
+}
+var p = Point();
+for (var i = 0; i < %d; i = i + 1) {
+  p.x = p.y + 1;
+  p.y = p.z + p.x;
+  p.z = p.x;
+}
+'''
+ACCESSES_PER_ITERATION = 7
+
+
+def run(engine: str, source: str):
+    from main import Lox
+
+    lox = Lox(engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        lox.run(source)
+    if lox.had_error or lox.had_runtime_error:
+        print(f'benchmark program failed on the {engine} engine')
+        sys.exit(1)
+    return lox
+
+
+def instance_bytes(engine: str, count: int) -> float:
+    run(engine, RECORDS % 1)  # imports and compiles everything once so only the records are measured
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    lox = run(engine, RECORDS % count)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del lox
+    return used / count
+
+
+def main():
+    from main import ENGINES
+
+    arg_parser = argparse.ArgumentParser(description='Instance memory / field access benchmark')
+    arg_parser.add_argument('--instances', type=int, default=100000, help='instances kept alive for the memory measurement')
+    arg_parser.add_argument('--accesses', type=int, default=1000000, help='field reads and writes for the timing')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions, the best one is reported')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), action='append', help='engine to measure, all by default')
+    args = arg_parser.parse_args()
+
+    iterations = args.accesses // ACCESSES_PER_ITERATION
+    accesses = iterations * ACCESSES_PER_ITERATION
+    for engine in args.engine or ENGINES.keys():
+        memory = instance_bytes(engine, args.instances)
+        seconds = best_time(lambda: run(engine, ACCESSES % iterations), args.repeat)
+        print(f'{engine:<8} {memory:.1f} bytes per instance (4 fields), '
+              f'{accesses} field accesses in {seconds:.3f} s ({accesses / seconds:,.0f} accesses/s)')
+
+
+if __name__ == '__main__':
+    main()
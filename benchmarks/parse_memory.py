@@ -0,0 +1,124 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+# Measures the memory held by tokens and AST nodes, and the scan/parse throughput, on a large generated source
+# usage: python3 benchmarks/parse_memory.py [--size MB] [--repeat N] [--validate]
+# Run it on two checkouts to compare a change before and after
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# '$' is replaced by a counter so that every copy declares different names
+TEMPLATE = '''
+fun fib_$(n) {
+  if (n <= 1) return n;
+  return fib_$(n - 2) + fib_$(n - 1);
+}
+
+class Point_$ {
+  init() {
+    this.x = 1;
+    this.y = 2;
+  }
+
+  length() {
+    return this.x * this.x + this.y * this.y;
+  }
+}
+
+var total_$ = 0;
+for (var i = 0; i < 10; i = i + 1) {
+  var point = Point_$();
+  total_$ = total_$ + point.length() / 2 - fib_$(i);
+  if (total_$ > 100 and !(total_$ == 50)) {
+    print "big " + "total";
+  } else {
+    total_$ = -total_$;
+  }
+}
+'''
+
+
+def generate_source(size: int) -> str:
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        part = TEMPLATE.replace('$', str(i))
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return ''.join(parts)
+
+
+def count_nodes(statements) -> int:
+    from expr import Expr
+    from stmt import Stmt
+
+    count = 0
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, (Expr, Stmt)):
+            continue
+        count += 1
+        if hasattr(node, '__dict__'):
+            stack.extend(node.__dict__.values())
+        else:
+            stack.extend(getattr(node, slot) for slot in type(node).__slots__)
+    return count
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Token and AST memory / throughput benchmark')
+    arg_parser.add_argument('--size', type=float, default=2.0, help='size of the generated source in MB')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions, the best one is reported')
+    arg_parser.add_argument('--validate', action='store_true', help='run the AST constructor type checks')
+    args = arg_parser.parse_args()
+
+    if args.validate:
+        os.environ['PYLOX_VALIDATE_AST'] = '1'  # read when expr.py is imported
+
+    from main import Lox
+    from scanner import Scanner
+    from parser import Parser
+
+    lox = Lox()
+    source = generate_source(int(args.size * 1024 * 1024))
+    megabytes = len(source) / (1024 * 1024)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tokens = Scanner(source, lox).scan_tokens()
+    token_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    statements = Parser(tokens, lox).parse()
+    ast_bytes = tracemalloc.get_traced_memory()[0] - baseline - token_bytes
+    tracemalloc.stop()
+    nodes = count_nodes(statements)
+
+    scan_time = best_time(lambda: Scanner(source, lox).scan_tokens(), args.repeat)
+    parse_time = best_time(lambda: Parser(tokens, lox).parse(), args.repeat)
+
+    print(f'source:      {megabytes:.2f} MB, {len(tokens)} tokens, {nodes} AST nodes')
+    print(f'tokens:      {token_bytes / len(tokens):.1f} bytes per token')
+    print(f'AST:         {ast_bytes / nodes:.1f} bytes per node')
+    print(f'scan:        {scan_time:.3f} s  ({megabytes / scan_time:.2f} MB/s, {len(tokens) / scan_time:,.0f} tokens/s)')
+    print(f'parse:       {parse_time:.3f} s  ({megabytes / parse_time:.2f} MB/s, {nodes / parse_time:,.0f} nodes/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import io
+import os
+import sys
+
+# Compares tokenization speed of the character by character Scanner and the regex based FastScanner
+# usage: python3 benchmarks/scanner_benchmark.py [--size MB] [--repeat N]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parse_memory import generate_source, best_time
+
+# sources the scanners have to agree on beyond the generated one, blanks at the very end included
+EDGE_CASES = ['', '   ', 'print 1; ', 'print 1;\t\r ', 'a\n  ', '"abc" ', 'x // c\n ', 'a  b\n\n  c \t']
+
+
+def token_stream(scanner) -> list:
+    return [(t.token_type, t.lexeme, t.literal, t.line) for t in scanner.scan_tokens()]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Scanner throughput benchmark')
+    arg_parser.add_argument('--size', type=float, default=2.0, help='size of the generated source in MB')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions, the best one is reported')
+    args = arg_parser.parse_args()
+
+    from main import Lox
+    from scanner import Scanner, FastScanner, StreamingScanner
+
+    lox = Lox()
+    for edge_case in EDGE_CASES:
+        expected = token_stream(Scanner(edge_case, lox))
+        if token_stream(FastScanner(edge_case, lox)) != expected or \
+                token_stream(StreamingScanner(io.StringIO(edge_case), lox)) != expected:
+            print(f'FastScanner or StreamingScanner token stream differs from Scanner on {edge_case!r}')
+            sys.exit(1)
+
+    source = generate_source(int(args.size * 1024 * 1024))
+    megabytes = len(source) / (1024 * 1024)
+
+    expected = token_stream(Scanner(source, lox))
+    actual = token_stream(FastScanner(source, lox))
+    if expected != actual:
+        print('FastScanner token stream differs from Scanner')
+        sys.exit(1)
+
+    results = {}
+    for scanner_class in (Scanner, FastScanner):
+        seconds = best_time(lambda: scanner_class(source, lox).scan_tokens(), args.repeat)
+        results[scanner_class.__name__] = seconds
+        print(f'{scanner_class.__name__:<12} {seconds:.3f} s  ({megabytes / seconds:.2f} MB/s, {len(expected) / seconds:,.0f} tokens/s)')
+    print(f'speedup:     {results["Scanner"] / results["FastScanner"]:.1f}x on {megabytes:.2f} MB, {len(expected)} tokens')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+# Compares building a long string with + against a StringBuilder, for each engine
+# usage: python3 benchmarks/string_builder.py [--count N] [--repeat N] [--engine NAME]
+# Every + copies the text built so far, so the + loop takes time quadratic in count; the builder's is linear
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parse_memory import best_time
+
+CONCATENATION = '''
+var text = "";
+for (var i = 0; i < COUNT; i = i + 1) {
+  text = text + "report line" + "\\n";
+}
+print len(text);
+'''
+
+BUILDER = '''
+var text = StringBuilder();
+for (var i = 0; i < COUNT; i = i + 1) {
+  text.append("report line").append("\\n");
+}
+print len(text.build());
+'''
+
+
+def run(engine: str, source: str) -> str:
+    from main import Lox
+
+    lox = Lox(engine)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        lox.run(source)
+    if lox.had_error or lox.had_runtime_error:
+        print(f'benchmark program failed on the {engine} engine')
+        sys.exit(1)
+    return output.getvalue()
+
+
+def main():
+    from main import ENGINES
+
+    arg_parser = argparse.ArgumentParser(description='String concatenation benchmark')
+    arg_parser.add_argument('--count', type=int, default=100000, help='pieces appended to the string')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions, the best one is reported')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), action='append', help='engine to measure, all by default')
+    args = arg_parser.parse_args()
+
+    concatenation = CONCATENATION.replace('COUNT', str(args.count))
+    builder = BUILDER.replace('COUNT', str(args.count))
+    print(f'{args.count} appends, {len("report line") + 1} characters each')
+    print(f'{"engine":<8} {"+ s":>10} {"builder s":>10} {"speedup":>8}')
+    for engine in args.engine or ENGINES.keys():
+        if run(engine, concatenation) != run(engine, builder):
+            print(f'the two programs built different strings on the {engine} engine')
+            sys.exit(1)
+        plus = best_time(lambda: run(engine, concatenation), args.repeat)
+        built = best_time(lambda: run(engine, builder), args.repeat)
+        print(f'{engine:<8} {plus:>10.4f} {built:>10.4f} {plus / built:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
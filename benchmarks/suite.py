@@ -0,0 +1,123 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Times the scan, parse, resolve, optimize and execute phases of Lox.run on the programs in benchmarks/programs
+# usage: python3 benchmarks/suite.py [--engine NAME] [--program NAME] [--repeat N] [--output FILE] [--baseline FILE]
+# Save the results of one checkout with --output, then run another with --baseline to get the percent changes
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PROGRAMS = os.path.join(BENCHMARKS, 'programs')
+PHASES = ['scan', 'parse', 'resolve', 'optimize', 'execute']
+
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+
+
+def time_phases(engine: str, source: str) -> dict:
+    """ Seconds taken by each phase of one run, the same steps as Lox.run on a new interpreter """
+    from main import Lox
+    from scanner import FastScanner
+    from parser import Parser
+    from resolver import Resolver
+    from optimizer import Optimizer
+
+    lox = Lox(engine)
+    times = {}
+    start = time.perf_counter()
+    tokens = FastScanner(source, lox).scan_tokens()
+    times['scan'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    statements = Parser(tokens, lox).parse()
+    times['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Resolver(lox.interpreter, lox).resolve_list(statements)
+    times['resolve'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    statements = Optimizer(lox.interpreter).optimize_list(statements)
+    times['optimize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        lox.interpreter.interpret(statements)
+    times['execute'] = time.perf_counter() - start
+
+    if lox.had_error or lox.had_runtime_error:
+        raise SystemExit(f'benchmark program failed on the {engine} engine')
+    return times
+
+
+def measure(engine: str, source: str, repeat: int) -> dict:
+    runs = [time_phases(engine, source) for _ in range(repeat)]
+    return {phase: {'min': min(run[phase] for run in runs),
+                    'median': statistics.median(run[phase] for run in runs)} for phase in PHASES}
+
+
+def percent_change(before: float, after: float) -> str:
+    if before == 0:
+        return 'n/a'
+    return f'{100 * (after - before) / before:+.1f}%'
+
+
+def print_results(results: dict):
+    print(f'{"program":<20} {"engine":<8} {"phase":<9} {"min s":>10} {"median s":>10}')
+    for program, engines in results.items():
+        for engine, phases in engines.items():
+            for phase in PHASES:
+                print(f'{program:<20} {engine:<8} {phase:<9} {phases[phase]["min"]:>10.5f} {phases[phase]["median"]:>10.5f}')
+
+
+def print_comparison(results: dict, baseline: dict):
+    """ Median of each phase against the baseline, negative changes are speedups """
+    print(f'{"program":<20} {"engine":<8} {"phase":<9} {"baseline s":>10} {"median s":>10} {"change":>8}')
+    for program, engines in results.items():
+        for engine, phases in engines.items():
+            before = baseline.get(program, {}).get(engine)
+            if before is None:
+                print(f'{program:<20} {engine:<8} not in the baseline')
+                continue
+            for phase in PHASES:
+                old = before[phase]['median']
+                new = phases[phase]['median']
+                print(f'{program:<20} {engine:<8} {phase:<9} {old:>10.5f} {new:>10.5f} {percent_change(old, new):>8}')
+
+
+def main():
+    from main import ENGINES
+
+    programs = sorted(name[:-len('.lox')] for name in os.listdir(PROGRAMS) if name.endswith('.lox'))
+    arg_parser = argparse.ArgumentParser(description='Lox benchmark suite')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), action='append', help='engine to measure, all by default')
+    arg_parser.add_argument('--program', choices=programs, action='append', help='program to run, all by default')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='runs of each program, min and median are reported')
+    arg_parser.add_argument('--output', metavar='FILE', help='write the results as JSON, to be used as a later baseline')
+    arg_parser.add_argument('--baseline', metavar='FILE', help='JSON results of an earlier run to compare against')
+    args = arg_parser.parse_args()
+
+    results = {}
+    for program in args.program or programs:
+        with open(os.path.join(PROGRAMS, program + '.lox')) as f:
+            source = f.read()
+        results[program] = {engine: measure(engine, source, args.repeat) for engine in args.engine or ENGINES.keys()}
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f)['results'])
+    else:
+        print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'repeat': args.repeat, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+from array import array
+from bisect import bisect_right
+from enum import IntEnum
+
+
+class OpCode(IntEnum):
+    """ Instructions understood by the VirtualMachine, operands follow the opcode in the code buffer """
+    CONSTANT = 0           # constant index
+    NIL = 1
+    TRUE = 2
+    FALSE = 3
+    POP = 4
+    GET_LOCAL = 5          # depth, slot
+    SET_LOCAL = 6          # depth, slot
+    GET_GLOBAL = 7         # name index
+    SET_GLOBAL = 8         # name index
+    DEFINE = 9             # name index, defines in the current environment
+    GET_PROPERTY = 10      # name index
+    SET_PROPERTY = 11      # name index
+    EQUAL = 12
+    NOT_EQUAL = 13
+    GREATER = 14
+    GREATER_EQUAL = 15
+    LESS = 16
+    LESS_EQUAL = 17
+    ADD = 18
+    SUBTRACT = 19
+    MULTIPLY = 20
+    DIVIDE = 21
+    NOT = 22
+    NEGATE = 23
+    PRINT = 24
+    JUMP = 25              # target offset
+    POP_JUMP_IF_FALSE = 26 # target offset
+    JUMP_IF_FALSE_OR_POP = 27  # target offset, used by 'and'
+    JUMP_IF_TRUE_OR_POP = 28   # target offset, used by 'or'
+    CALL = 29              # argument count
+    FUNCTION = 30          # constant index of a FunctionProto
+    CLASS = 31             # name index, method count
+    RETURN = 32
+    PUSH_ENV = 33
+    POP_ENV = 34
+    LOAD_METHOD = 35       # name index, leaves the method and its instance, or the property and nil
+    CALL_METHOD = 36       # argument count, calls what LOAD_METHOD left
+    LOOP = 37              # target offset, jumps back to the start of a loop
+    SET_LOCAL_POP = 38     # depth, slot, an assignment whose value is not used, SET_LOCAL and POP in one
+    SET_GLOBAL_POP = 39    # name index, SET_GLOBAL and POP in one
+    DEFINE_LOCAL = 40      # defines in the current environment, which is not the globals
+
+
+OPERAND_COUNT = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 2,
+    OpCode.SET_LOCAL: 2,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.DEFINE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.JUMP: 1,
+    OpCode.POP_JUMP_IF_FALSE: 1,
+    OpCode.JUMP_IF_FALSE_OR_POP: 1,
+    OpCode.JUMP_IF_TRUE_OR_POP: 1,
+    OpCode.CALL: 1,
+    OpCode.FUNCTION: 1,
+    OpCode.CLASS: 2,
+    OpCode.LOAD_METHOD: 1,
+    OpCode.CALL_METHOD: 1,
+    OpCode.LOOP: 1,
+    OpCode.SET_LOCAL_POP: 2,
+    OpCode.SET_GLOBAL_POP: 1,
+}
+
+
+class Chunk:
+    """
+        A compiled unit of bytecode
+        Opcodes and their operands are stored as words in a flat array, constants in a separate pool
+        The line table is run-length encoded: line_numbers[i] applies from line_offsets[i] onwards
+    """
+
+    def __init__(self):
+        self.code = array('i')
+        self.constants = []
+        self.constant_indexes = {}
+        self.line_offsets = array('i')
+        self.line_numbers = array('i')
+
+    def write(self, word: int, line: int) -> int:
+        if not len(self.line_numbers) or self.line_numbers[-1] != line:
+            self.line_offsets.append(len(self.code))
+            self.line_numbers.append(line)
+        self.code.append(word)
+        return len(self.code) - 1
+
+    def add_constant(self, value) -> int:
+        # keyed on type as well, otherwise 1.0 and true would share a slot
+        key = (type(value), value) if isinstance(value, (str, float, bool)) else (type(value), id(value))
+        if key in self.constant_indexes:
+            return self.constant_indexes[key]
+        self.constants.append(value)
+        self.constant_indexes[key] = len(self.constants) - 1
+        return len(self.constants) - 1
+
+    def get_line(self, offset: int) -> int:
+        index = bisect_right(self.line_offsets, offset) - 1
+        return self.line_numbers[max(index, 0)] if len(self.line_numbers) else 0
+
+    def disassemble(self, name: str) -> str:
+        lines = [f'== {name} ==']
+        offset = 0
+        while offset < len(self.code):
+            op = OpCode(self.code[offset])
+            operands = list(self.code[offset + 1: offset + 1 + OPERAND_COUNT.get(op, 0)])
+            lines.append(f'{offset:04d} {self.get_line(offset):4d} {op.name:<20} {" ".join(str(o) for o in operands)}')
+            offset += 1 + len(operands)
+        return '\n'.join(lines)
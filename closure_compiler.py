@@ -0,0 +1,545 @@
+from operator import sub, truediv, mul
+from typing import List
+from expr import Expr, AssignExpr, Binary, CallExpr, GetExpr, Grouping, Literal, LogicalExpr, SetExpr, ThisExpr, \
+    Unary, VarExpr
+from stmt import Stmt, BlockStatement, ClassStatement, ExpressionStatement, FunctionStatement, IfStatement, \
+    PrintStatement, ReturnStatement, VarStatement, WhileStatement
+from lox_token import TokenType
+from lox_class import LoxClass
+from lox_instance import LoxInstance
+from lox_collections import COLLECTIONS
+from lox_callable import LoxCallable
+from lox_function import LoxFunction, TailCall
+from environment import Environment, GlobalEnvironment
+from interpreter import Interpreter
+from natives import NativeFunction
+from runtime_error import LoxRuntimeError
+
+# Compiles the resolved AST into a tree of python closures.
+# Each node is visited exactly once; the closures it produces already know their operator, their
+# resolved variable depth and their children, so running them skips accept() and the visit_* dispatch.
+# Expression closures take the current environment and return a value.  Statement closures take the
+# current environment and return None, or a one element tuple holding the value of an executed 'return'.
+
+ARITHMETIC = {
+    TokenType.MINUS: sub,
+    TokenType.SLASH: truediv,
+    TokenType.STAR: mul,
+}
+
+
+class ClosureFunction(LoxFunction):
+    """ A LoxFunction whose body has already been compiled to closures """
+
+    def __init__(self, declaration: FunctionStatement, closure: Environment | GlobalEnvironment, is_initializer: bool, body):
+        super().__init__(declaration, closure, is_initializer)
+        self.body = body
+        self.params = tuple(param.lexeme for param in declaration.params)
+
+    def call(self, interpreter, arguments: list):
+        result = self.body(Environment(self.closure, list(arguments)))
+        if result.__class__ is TailCall:
+            result = run_tail_calls(result)
+        if self.is_initializer:
+            return self.closure.get_at(0, 0)  # force return of 'this' for class initializers
+        if result is not None:
+            return result[0]
+        return None
+
+    def bind(self, instance):
+        return ClosureFunction(self.declaration, Environment(self.closure, [instance]), self.is_initializer, self.body)
+
+
+class ClosureCompiler:
+    """ Visits each node once and returns the closure that executes it """
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+
+    def compile(self, node: Expr | Stmt):
+        return node.accept(self)
+
+    def compile_block(self, statements: List[Stmt]):
+        compiled = tuple(self.compile(statement) for statement in statements)
+
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def run_block(env):
+            for statement in compiled:
+                result = statement(env)
+                if result is not None:
+                    return result
+            return None
+        return run_block
+
+    def compile_variable(self, expr: Expr, name):
+        if expr.depth is None:
+            key = name.lexeme
+            values = self.interpreter.globals.values
+
+            def get_global(env):
+                if key in values:
+                    return values[key]
+                raise LoxRuntimeError(name, f'Undefined variable: {key}')
+            return get_global
+
+        distance = expr.depth
+        slot = expr.slot
+        if distance == 0:
+            return lambda env: env.values[slot]
+        if distance == 1:
+            return lambda env: env.enclosing.values[slot]
+        if distance == 2:
+            return lambda env: env.enclosing.enclosing.values[slot]
+        return lambda env: env.ancestor(distance).values[slot]
+
+    # statements
+
+    def visit_block_statement(self, stmt: BlockStatement):
+        body = self.compile_block(stmt.statements)
+
+        def block(env):
+            return body(Environment(env))
+        return block
+
+    def visit_class_statement(self, stmt: ClassStatement):
+        name = stmt.name.lexeme
+        methods = [(method, method.name.lexeme == 'init', self.compile_block(method.body)) for method in stmt.methods]
+
+        def class_statement(env):
+            functions = {}
+            for method, is_initializer, body in methods:
+                functions[method.name.lexeme] = ClosureFunction(method, env, is_initializer, body)
+            env.define(name, LoxClass(name, functions))
+        return class_statement
+
+    def visit_expression_statement(self, stmt: ExpressionStatement):
+        expression = self.compile(stmt.expression)
+
+        def expression_statement(env):
+            expression(env)
+        return expression_statement
+
+    def visit_function_statement(self, stmt: FunctionStatement):
+        name = stmt.name.lexeme
+        body = self.compile_block(stmt.body)
+
+        def function_statement(env):
+            env.define(name, ClosureFunction(stmt, env, False, body))
+        return function_statement
+
+    def visit_if_statement(self, stmt: IfStatement):
+        condition = self.compile(stmt.condition)
+        then_branch = self.compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            def if_statement(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+                return None
+            return if_statement
+
+        else_branch = self.compile(stmt.else_branch)
+
+        def if_else_statement(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+        return if_else_statement
+
+    def visit_print_statement(self, stmt: PrintStatement):
+        expression = self.compile(stmt.expression)
+        interpreter = self.interpreter
+
+        def print_statement(env):
+            print(expression(env), file=interpreter.output)
+        return print_statement
+
+    def visit_return_statement(self, stmt: ReturnStatement):
+        if stmt.value is None:
+            return lambda env: (None,)
+        if isinstance(stmt.value, CallExpr):
+            return self.compile_call(stmt.value, True)
+        value = self.compile(stmt.value)
+        return lambda env: (value(env),)
+
+    def visit_var_statement(self, stmt: VarStatement):
+        name = stmt.name.lexeme
+        if stmt.initializer is None:
+            def declare(env):
+                env.define(name, None)
+            return declare
+
+        initializer = self.compile(stmt.initializer)
+
+        def var_statement(env):
+            env.define(name, initializer(env))
+        return var_statement
+
+    def visit_while_statement(self, stmt: WhileStatement):
+        condition = self.compile(stmt.condition)
+        body = self.compile(stmt.body)
+        keyword = stmt.keyword
+        interpreter = self.interpreter
+
+        def while_statement(env):
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return None
+                interpreter.countdown -= 1
+                if not interpreter.countdown:
+                    interpreter.check_limits(keyword)
+                result = body(env)
+                if result is not None:
+                    return result
+        return while_statement
+
+    # expressions
+
+    def visit_assign_expr(self, expr: AssignExpr):
+        value = self.compile(expr.value)
+        if expr.depth is None:
+            globals = self.interpreter.globals
+
+            def assign_global(env):
+                result = value(env)
+                globals.assign(expr.name, result)
+                return result
+            return assign_global
+
+        distance = expr.depth
+        slot = expr.slot
+
+        def assign_local(env):
+            result = value(env)
+            env.ancestor(distance).values[slot] = result
+            return result
+        return assign_local
+
+    def visit_this_expr(self, expr: ThisExpr):
+        return self.compile_variable(expr, expr.keyword)
+
+    def visit_var_expr(self, expr: VarExpr):
+        return self.compile_variable(expr, expr.name)
+
+    def visit_literal_expr(self, expr: Literal):
+        value = expr.value
+        return lambda env: value
+
+    def visit_grouping_expr(self, expr: Grouping):
+        return self.compile(expr.expression)
+
+    def visit_logical_expr(self, expr: LogicalExpr):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        if expr.operator.token_type == TokenType.OR:
+            def logical_or(env):
+                value = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+            return logical_or
+
+        def logical_and(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+        return logical_and
+
+    def visit_set_expr(self, expr: SetExpr):
+        object_fn = self.compile(expr.object)
+        value_fn = self.compile(expr.value)
+        name = expr.name
+        key = name.lexeme
+        cached_shape = None  # inline cache, instances of cached_shape have the field at cached_index
+        cached_index = None
+        cached_transition = None  # or gain it by moving to this shape
+
+        def set_expr(env):
+            nonlocal cached_shape, cached_index, cached_transition
+            object = object_fn(env)
+            if not isinstance(object, LoxInstance):
+                raise LoxRuntimeError(name, 'Only instances have fields')
+            value = value_fn(env)
+            shape = object.shape
+            if shape is cached_shape and shape is not None:
+                if cached_transition is None:
+                    object.values[cached_index] = value
+                else:
+                    object.values.append(value)
+                    object.shape = cached_transition
+                return value
+            object.set(name, value)
+            if shape is not None and object.shape is not None:
+                cached_shape = shape
+                cached_index = object.shape.slots[key]
+                cached_transition = None if object.shape is shape else object.shape
+            return value
+        return set_expr
+
+    def visit_get_expr(self, expr: GetExpr):
+        object_fn = self.compile(expr.object)
+        name = expr.name
+        key = name.lexeme
+        cached_shape = None  # inline cache, instances of cached_shape have the field at cached_index
+        cached_index = None
+
+        def get_expr(env):
+            nonlocal cached_shape, cached_index
+            object = object_fn(env)
+            if isinstance(object, LoxInstance):
+                shape = object.shape
+                if shape is cached_shape and cached_index is not None:
+                    return object.values[cached_index]
+                if shape is not None:
+                    cached_shape = shape
+                    cached_index = shape.slots.get(key)
+                return object.get(name)  # methods are bound on every access anyway
+            if isinstance(object, COLLECTIONS):
+                return object.get(name)
+            raise LoxRuntimeError(name, 'Only instances have properties')
+        return get_expr
+
+    def visit_unary_expr(self, expr: Unary):
+        right = self.compile(expr.right)
+        operator = expr.operator
+        match operator.token_type:
+            case TokenType.MINUS:
+                def negate(env):
+                    value = right(env)
+                    if not isinstance(value, float):
+                        raise LoxRuntimeError(operator, 'Operand must be a number')
+                    return -value
+                return negate
+            case TokenType.BANG:
+                return lambda env: not right(env)
+
+    def visit_binary_expr(self, expr: Binary):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        operator = expr.operator
+        token_type = operator.token_type
+
+        if token_type in ARITHMETIC:
+            arithmetic = ARITHMETIC[token_type]
+            if isinstance(expr.right, Literal) and isinstance(expr.right.value, float):
+                # the right operand is known to be a number, only the left one needs checking
+                constant = expr.right.value
+
+                def arithmetic_constant(env):
+                    a = left(env)
+                    if not isinstance(a, float):
+                        raise LoxRuntimeError(operator, 'Operands must be numbers')
+                    return arithmetic(a, constant)
+                return arithmetic_constant
+
+            def arithmetic_expr(env):
+                a = left(env)
+                b = right(env)
+                if not isinstance(a, float) or not isinstance(b, (float, int)):
+                    raise LoxRuntimeError(operator, 'Operands must be numbers')
+                return arithmetic(a, b)
+            return arithmetic_expr
+
+        match token_type:
+            case TokenType.PLUS:
+                def add(env):
+                    a = left(env)
+                    b = right(env)
+                    if (isinstance(a, float) and isinstance(b, float)) or (isinstance(a, str) and isinstance(b, str)):
+                        return a + b
+                    raise LoxRuntimeError(operator, f"Operands must be matching strings or numbers, left={a} {type(a)}, right={b} {type(b)}")
+                return add
+            case TokenType.GREATER:
+                return lambda env: left(env) > right(env)
+            case TokenType.GREATER_EQUAL:
+                return lambda env: left(env) >= right(env)
+            case TokenType.LESS:
+                return lambda env: left(env) < right(env)
+            case TokenType.LESS_EQUAL:
+                return lambda env: left(env) <= right(env)
+            case TokenType.BANG_EQUAL:
+                is_equal = self.interpreter.is_equal
+                return lambda env: not is_equal(left(env), right(env))
+            case TokenType.EQUAL_EQUAL:
+                is_equal = self.interpreter.is_equal
+                return lambda env: is_equal(left(env), right(env))
+
+    def visit_call_expr(self, expr: CallExpr):
+        return self.compile_call(expr, False)
+
+    def compile_call(self, expr: CallExpr, tail: bool):
+        """
+            Calls in tail position (tail=True) return from the function they are made in: lox functions are not
+            run but handed back as a TailCall for the caller to run, other callees return their value as (value,)
+        """
+        if isinstance(expr.callee, GetExpr):
+            return self.compile_invoke(expr, tail)
+        callee_fn = self.compile(expr.callee)
+        arguments_fn = tuple(self.compile(argument) for argument in expr.arguments)
+        paren = expr.paren
+        interpreter = self.interpreter
+        max_call_depth = interpreter.max_call_depth
+
+        def call_expr(env):
+            interpreter.calls += 1
+            interpreter.countdown -= 1
+            if not interpreter.countdown:
+                interpreter.check_limits(paren)
+            callee = callee_fn(env)
+            if callee.__class__ is ClosureFunction:
+                # fast path for lox functions, the body is run without going through call()
+                arguments = [argument(env) for argument in arguments_fn]
+                params = callee.params
+                if len(arguments) != len(params):
+                    raise LoxRuntimeError(paren, f'Expected {len(params)} arguments but got {len(arguments)}')
+                environment = Environment(callee.closure, arguments)
+                if tail and not callee.is_initializer:
+                    return TailCall(callee, environment)
+                if interpreter.call_depth >= max_call_depth:
+                    raise LoxRuntimeError(paren, 'Stack overflow')
+                interpreter.call_depth += 1
+                try:
+                    result = callee.body(environment)
+                    if result.__class__ is TailCall:
+                        result = run_tail_calls(result)
+                finally:
+                    interpreter.call_depth -= 1
+                if callee.is_initializer:
+                    result = (callee.closure.get_at(0, 0),)
+                if tail:
+                    return result or (None,)
+                if result is not None:
+                    return result[0]
+                return None
+            if callee.__class__ is NativeFunction:
+                # registered python functions take the argument values, no environment or call frame is needed
+                value = call_native_function(paren, callee, [argument(env) for argument in arguments_fn])
+                return (value,) if tail else value
+
+            if not isinstance(callee, LoxCallable):
+                raise LoxRuntimeError(paren, 'Can only call functions and classes')
+            arguments = [argument(env) for argument in arguments_fn]
+            if len(arguments) != callee.arity():
+                raise LoxRuntimeError(paren, f'Expected {callee.arity()} arguments but got {len(arguments)}')
+            value = call_native(interpreter, paren, callee, arguments)
+            return (value,) if tail else value
+        return call_expr
+
+    def compile_invoke(self, expr: CallExpr, tail: bool):
+        """ Fused get and call for obj.method(...), the method runs with 'this' bound but is never bound itself """
+        object_fn = self.compile(expr.callee.object)
+        arguments_fn = tuple(self.compile(argument) for argument in expr.arguments)
+        name = expr.callee.name
+        key = name.lexeme
+        paren = expr.paren
+        interpreter = self.interpreter
+        max_call_depth = interpreter.max_call_depth
+        cached_shape = None  # inline cache of this call site, the method key resolves to for cached_shape
+        cached_method = None
+
+        def invoke(env):
+            nonlocal cached_shape, cached_method
+            interpreter.calls += 1
+            interpreter.countdown -= 1
+            if not interpreter.countdown:
+                interpreter.check_limits(paren)
+            object = object_fn(env)
+            if object.__class__ is LoxInstance and object.shape is not None:
+                shape = object.shape
+                if shape is not cached_shape:
+                    # a field of the same name shadows the method
+                    cached_method = None if key in shape.slots else object.lox_class.find_method(key)
+                    cached_shape = shape
+                method = cached_method
+                if method.__class__ is ClosureFunction:
+                    arguments = [argument(env) for argument in arguments_fn]
+                    params = method.params
+                    if len(arguments) != len(params):
+                        raise LoxRuntimeError(paren, f'Expected {len(params)} arguments but got {len(arguments)}')
+                    environment = Environment(Environment(method.closure, [object]), arguments)
+                    if tail and not method.is_initializer:
+                        return TailCall(method, environment)
+                    if interpreter.call_depth >= max_call_depth:
+                        raise LoxRuntimeError(paren, 'Stack overflow')
+                    interpreter.call_depth += 1
+                    try:
+                        result = method.body(environment)
+                        if result.__class__ is TailCall:
+                            result = run_tail_calls(result)
+                    finally:
+                        interpreter.call_depth -= 1
+                    if method.is_initializer:
+                        result = (object,)
+                    if tail:
+                        return result or (None,)
+                    if result is not None:
+                        return result[0]
+                    return None
+
+            if object.__class__ in COLLECTIONS:
+                method = object.methods.get(key)
+                if method is not None:
+                    value = call_native_function(paren, method, [argument(env) for argument in arguments_fn], object)
+                    return (value,) if tail else value
+            elif not isinstance(object, LoxInstance):
+                raise LoxRuntimeError(name, 'Only instances have properties')
+            callee = object.get(name)
+            if not isinstance(callee, LoxCallable):
+                raise LoxRuntimeError(paren, 'Can only call functions and classes')
+            arguments = [argument(env) for argument in arguments_fn]
+            if len(arguments) != callee.arity():
+                raise LoxRuntimeError(paren, f'Expected {callee.arity()} arguments but got {len(arguments)}')
+            value = call_native(interpreter, paren, callee, arguments)
+            return (value,) if tail else value
+        return invoke
+
+
+def run_tail_calls(call: TailCall):
+    """ Runs a chain of calls made in tail position one after the other, returns the result of the last one """
+    result = call
+    while result.__class__ is TailCall:
+        result = result.function.body(result.environment)
+    return result
+
+
+def call_native(interpreter: Interpreter, paren, callee: LoxCallable, arguments: list):
+    """ Calls anything that is not run by the fast paths, classes and natives, on the lox call stack """
+    if interpreter.call_depth >= interpreter.max_call_depth:
+        raise LoxRuntimeError(paren, 'Stack overflow')
+    interpreter.call_depth += 1
+    try:
+        return callee.call(interpreter, arguments)
+    except LoxRuntimeError as error:
+        if error.operator is None:
+            error.operator = paren
+        raise
+    finally:
+        interpreter.call_depth -= 1
+
+
+def call_native_function(paren, callee: NativeFunction, arguments: list, *receiver):
+    """ Calls a registered python function directly, it takes no place on the lox call stack """
+    if len(arguments) != callee.parameter_count:
+        raise LoxRuntimeError(paren, f'Expected {callee.parameter_count} arguments but got {len(arguments)}')
+    try:
+        return callee.function(*receiver, *arguments)
+    except LoxRuntimeError as error:
+        if error.operator is None:
+            error.operator = paren
+        raise
+
+
+class ClosureInterpreter(Interpreter):
+    """ Runs programs by compiling them with the ClosureCompiler instead of walking the tree """
+
+    def interpret(self, statements: List[Stmt]):
+        try:
+            program = ClosureCompiler(self).compile_block(statements)
+            program(self.globals)
+        except LoxRuntimeError as e:
+            self.main.runtime_error(e)
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import pickle
+import sys
+import zlib
+
+# Modules that decide what a resolved AST looks like, a change to any of them invalidates every cached program
+FRONT_END_MODULES = ('lox_token.py', 'scanner.py', 'parser.py', 'expr.py', 'stmt.py', 'resolver.py',
+                     'optimizer.py')
+CACHE_SUFFIX = '.loxc'
+FORMAT_VERSION = b'1'
+
+_interpreter_version = None
+
+
+def interpreter_version() -> bytes:
+    """ Hash of the front end sources and the python version, computed once per process """
+    global _interpreter_version
+    if _interpreter_version is None:
+        digest = hashlib.sha256(FORMAT_VERSION + sys.version.encode())
+        base = os.path.dirname(os.path.abspath(__file__))
+        for module in FRONT_END_MODULES:
+            with open(os.path.join(base, module), 'rb') as f:
+                digest.update(f.read())
+        _interpreter_version = digest.digest()
+    return _interpreter_version
+
+
+class CompileCache:
+    """
+        On disk cache of parsed and resolved programs
+        Entries are keyed by the hash of the source and of the interpreter version, so an edited script or an
+        updated interpreter simply misses and its stale entries age out.  Entries are zlib compressed pickles
+        of the resolved statements; once the directory grows past max_bytes the least recently used ones go
+    """
+
+    DIRECTORY_NAME = '__loxcache__'
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, file_name: str) -> str:
+        with open(file_name, 'rb') as f:
+            digest = hashlib.file_digest(f, 'sha256')
+        digest.update(interpreter_version())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def load(self, key: str) -> list | None:
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            statements = pickle.loads(zlib.decompress(data))
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.remove(path)  # unreadable or written by something else, rebuild it
+            return None
+        try:
+            os.utime(path)  # the modification time doubles as the last use for eviction
+        except OSError:
+            pass
+        return statements
+
+    def store(self, key: str, statements: list) -> None:
+        # the cache is an optimization, failing to write it must never fail the run
+        try:
+            data = zlib.compress(pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL))
+        except RecursionError:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f'{self.path(key)}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, self.path(key))  # atomic, concurrent runs never see half written entries
+            self.evict()
+        except OSError:
+            return None
+
+    def entries(self) -> list:
+        """ (last use, size, path) of every entry, least recently used first """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(CACHE_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self) -> None:
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        if os.path.isdir(self.directory):
+            for _, _, path in self.entries():
+                self.remove(path)
+
+    def remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
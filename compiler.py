@@ -0,0 +1,243 @@
+from typing import List
+from bytecode import Chunk, OpCode
+from expr import Expr, AssignExpr, Binary, CallExpr, GetExpr, Grouping, Literal, LogicalExpr, SetExpr, ThisExpr, \
+    Unary, VarExpr
+from stmt import Stmt, BlockStatement, ClassStatement, ExpressionStatement, FunctionStatement, IfStatement, \
+    PrintStatement, ReturnStatement, VarStatement, WhileStatement
+from lox_token import Token, TokenType
+
+
+BINARY_OPCODES = {
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.SLASH: OpCode.DIVIDE,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+}
+
+
+class FunctionProto:
+    """ The compiled, environment independent part of a function """
+
+    def __init__(self, name: str, params: tuple, chunk: Chunk, is_initializer: bool):
+        self.name = name
+        self.params = params
+        self.chunk = chunk
+        self.is_initializer = is_initializer
+        self.declaration = None  # the FunctionStatement, memoize() reads what the resolver found about it
+
+    def __repr__(self):
+        return f'<proto {self.name}>'
+
+
+class Compiler:
+    """ Lowers the resolved AST into bytecode chunks for the VirtualMachine """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.chunk = None
+        self.line = 0  # line of the last token seen, used for the line table
+        self.scope_depth = 0  # blocks and functions the code being compiled is nested in, 0 at the top of the script
+
+    def compile_script(self, statements: List[Stmt]) -> FunctionProto:
+        self.scope_depth = -1  # the script body runs in the globals, unlike function bodies
+        return self.compile_function('script', (), statements, False)
+
+    def compile_function(self, name: str, params: tuple, body: List[Stmt], is_initializer: bool) -> FunctionProto:
+        enclosing = self.chunk
+        self.chunk = Chunk()
+        self.scope_depth += 1
+        for statement in body:
+            self.compile(statement)
+        self.scope_depth -= 1
+        self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+        proto = FunctionProto(name, params, self.chunk, is_initializer)
+        self.chunk = enclosing
+        return proto
+
+    def compile(self, node: Expr | Stmt):
+        node.accept(self)
+
+    def emit(self, *words: int) -> int:
+        for word in words:
+            offset = self.chunk.write(word, self.line)
+        return offset
+
+    def emit_jump(self, op: OpCode) -> int:
+        """ Emits a jump with a placeholder target, returns the offset to patch """
+        return self.emit(op, -1)
+
+    def patch_jump(self, offset: int):
+        self.chunk.code[offset] = len(self.chunk.code)
+
+    def emit_variable(self, expr: Expr, name: Token, local_op: OpCode, global_op: OpCode):
+        self.line = name.line
+        if expr.depth is None:
+            self.emit(global_op, self.chunk.add_constant(name.lexeme))
+        else:
+            self.emit(local_op, expr.depth, expr.slot)
+
+    # statements
+
+    def visit_block_statement(self, stmt: BlockStatement):
+        self.emit(OpCode.PUSH_ENV)
+        self.scope_depth += 1
+        for statement in stmt.statements:
+            self.compile(statement)
+        self.scope_depth -= 1
+        self.emit(OpCode.POP_ENV)
+
+    def emit_define(self, name: str):
+        if self.scope_depth:
+            self.emit(OpCode.DEFINE_LOCAL)
+        else:
+            self.emit(OpCode.DEFINE, self.chunk.add_constant(name))
+
+    def visit_class_statement(self, stmt: ClassStatement):
+        for method in stmt.methods:
+            self.emit_function(method, method.name.lexeme == 'init')
+        self.line = stmt.name.line
+        self.emit(OpCode.CLASS, self.chunk.add_constant(stmt.name.lexeme), len(stmt.methods))
+
+    def visit_expression_statement(self, stmt: ExpressionStatement):
+        expression = stmt.expression
+        if expression.__class__ is AssignExpr:
+            # an assignment statement leaves nothing on the stack to pop
+            self.compile(expression.value)
+            self.emit_variable(expression, expression.name, OpCode.SET_LOCAL_POP, OpCode.SET_GLOBAL_POP)
+            return
+        self.compile(expression)
+        self.emit(OpCode.POP)
+
+    def visit_function_statement(self, stmt: FunctionStatement):
+        self.emit_function(stmt, False)
+        self.emit_define(stmt.name.lexeme)
+
+    def emit_function(self, stmt: FunctionStatement, is_initializer: bool):
+        self.line = stmt.name.line
+        params = tuple(param.lexeme for param in stmt.params)
+        proto = self.compile_function(stmt.name.lexeme, params, stmt.body, is_initializer)
+        proto.declaration = stmt
+        self.line = stmt.name.line
+        self.emit(OpCode.FUNCTION, self.chunk.add_constant(proto))
+
+    def visit_if_statement(self, stmt: IfStatement):
+        self.compile(stmt.condition)
+        else_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            self.patch_jump(else_jump)
+            return
+        end_jump = self.emit_jump(OpCode.JUMP)
+        self.patch_jump(else_jump)
+        self.compile(stmt.else_branch)
+        self.patch_jump(end_jump)
+
+    def visit_print_statement(self, stmt: PrintStatement):
+        self.compile(stmt.expression)
+        self.emit(OpCode.PRINT)
+
+    def visit_return_statement(self, stmt: ReturnStatement):
+        if stmt.value is None:
+            self.emit(OpCode.NIL)
+        else:
+            self.compile(stmt.value)
+        self.line = stmt.keyword.line
+        self.emit(OpCode.RETURN)
+
+    def visit_var_statement(self, stmt: VarStatement):
+        if stmt.initializer is None:
+            self.emit(OpCode.NIL)
+        else:
+            self.compile(stmt.initializer)
+        self.line = stmt.name.line
+        self.emit_define(stmt.name.lexeme)
+
+    def visit_while_statement(self, stmt: WhileStatement):
+        loop_start = len(self.chunk.code)
+        self.compile(stmt.condition)
+        exit_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile(stmt.body)
+        self.line = stmt.keyword.line
+        self.emit(OpCode.LOOP, loop_start)
+        self.patch_jump(exit_jump)
+
+    # expressions
+
+    def visit_assign_expr(self, expr: AssignExpr):
+        self.compile(expr.value)
+        self.emit_variable(expr, expr.name, OpCode.SET_LOCAL, OpCode.SET_GLOBAL)
+
+    def visit_this_expr(self, expr: ThisExpr):
+        self.emit_variable(expr, expr.keyword, OpCode.GET_LOCAL, OpCode.GET_GLOBAL)
+
+    def visit_var_expr(self, expr: VarExpr):
+        self.emit_variable(expr, expr.name, OpCode.GET_LOCAL, OpCode.GET_GLOBAL)
+
+    def visit_literal_expr(self, expr: Literal):
+        if expr.value is None:
+            self.emit(OpCode.NIL)
+        elif expr.value is True:
+            self.emit(OpCode.TRUE)
+        elif expr.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emit(OpCode.CONSTANT, self.chunk.add_constant(expr.value))
+
+    def visit_grouping_expr(self, expr: Grouping):
+        self.compile(expr.expression)
+
+    def visit_logical_expr(self, expr: LogicalExpr):
+        self.compile(expr.left)
+        if expr.operator.token_type == TokenType.OR:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_TRUE_OR_POP)
+        else:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_FALSE_OR_POP)
+        self.compile(expr.right)
+        self.patch_jump(end_jump)
+
+    def visit_set_expr(self, expr: SetExpr):
+        self.compile(expr.object)
+        self.compile(expr.value)
+        self.line = expr.name.line
+        self.emit(OpCode.SET_PROPERTY, self.chunk.add_constant(expr.name.lexeme))
+
+    def visit_get_expr(self, expr: GetExpr):
+        self.compile(expr.object)
+        self.line = expr.name.line
+        self.emit(OpCode.GET_PROPERTY, self.chunk.add_constant(expr.name.lexeme))
+
+    def visit_unary_expr(self, expr: Unary):
+        self.compile(expr.right)
+        self.line = expr.operator.line
+        if expr.operator.token_type == TokenType.MINUS:
+            self.emit(OpCode.NEGATE)
+        else:
+            self.emit(OpCode.NOT)
+
+    def visit_binary_expr(self, expr: Binary):
+        self.compile(expr.left)
+        self.compile(expr.right)
+        self.line = expr.operator.line
+        self.emit(BINARY_OPCODES[expr.operator.token_type])
+
+    def visit_call_expr(self, expr: CallExpr):
+        if isinstance(expr.callee, GetExpr):
+            # obj.method(...) calls the method with 'this' bound, without creating a bound method
+            self.compile(expr.callee.object)
+            self.line = expr.callee.name.line
+            self.emit(OpCode.LOAD_METHOD, self.chunk.add_constant(expr.callee.name.lexeme))
+            call = OpCode.CALL_METHOD
+        else:
+            self.compile(expr.callee)
+            call = OpCode.CALL
+        for argument in expr.arguments:
+            self.compile(argument)
+        self.line = expr.paren.line
+        self.emit(call, len(expr.arguments))
@@ -1,14 +1,47 @@
 from lox_token import Token
 from runtime_error import LoxRuntimeError
 
-class Environment:
-    """ Tracks variables """
+allocated = 0  # Environments created by this process, read by metrics.py
 
-    def __init__(self, enclosing: 'Environment' or None = None):
+class Environment:
+    """
+        Tracks local variables
+        Variables live in a list of slots, the resolver hands out slot indexes in declaration order
+        so a variable is always found at the same (depth, slot) pair
+    """
+    __slots__ = ('values', 'enclosing')
+
+    def __init__(self, enclosing: 'Environment | GlobalEnvironment | None' = None, values: list | None = None):
         # signature uses forward refrences to indicate that the enclosing arg is an Environment class type
-        self.values = {}
+        global allocated
+        allocated += 1
+        self.values = [] if values is None else values
         self.enclosing = enclosing
 
+    def define(self, key, value):
+        # declarations run in the same order the resolver assigned their slots, so the key is not needed
+        self.values.append(value)
+
+    def get_at(self, distance: int, slot: int):
+        return self.ancestor(distance).values[slot]
+
+    def assign_at(self, distance: int, slot: int, value):
+        self.ancestor(distance).values[slot] = value
+
+    def ancestor(self, distance: int):
+        environment = self
+        for i in range(distance):
+            environment = environment.enclosing
+        return environment
+
+
+class GlobalEnvironment:
+    """ Tracks global variables, which are looked up by name since they can be used before being declared """
+    __slots__ = ('values',)
+
+    def __init__(self):
+        self.values = {}
+
     def define(self, key, value):
         # note that since we overwrite without checking existence, the variable can be reassigned
         # via the "var" keyword
@@ -19,31 +52,10 @@ class Environment:
         if key in self.values:
             self.values[key] = value
             return
-
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-
         raise LoxRuntimeError(name, f'Undefined variable: {key}')
 
     def get(self, name: Token):
         key = name.lexeme
         if key in self.values:
             return self.values[key]
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
         raise LoxRuntimeError(name, f'Undefined variable: {key}')
-
-    def get_at(self, distance: int, name: str):
-        return self.ancestor(distance).values.get(name)
-
-    def assign_at(self, distance: int, name: Token, value):
-        ancestor = self.ancestor(distance)
-        ancestor.values[name.lexeme] = value
-
-    def ancestor(self, distance: int):
-        environment = self
-        for i in range(distance):
-            environment = environment.enclosing
-        return environment
-
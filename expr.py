@@ -1,136 +1,214 @@
+import os
 from lox_token import Token
 from typing import List
 
+# Generated by tool/generate_ast.py, edit the type descriptions there instead of this file
+
+# constructor type checks are costly on large sources, set PYLOX_VALIDATE_AST=1 to run them
+VALIDATE = os.environ.get('PYLOX_VALIDATE_AST') == '1'
+
 
 class Expr:
-	pass
+	__slots__ = ()
+
+	def accept(self, visitor):
+		raise Exception('accept() method not yet implemented')
+
 
 class ThisExpr(Expr):
+	__slots__ = ('keyword', 'depth', 'slot')
+
 	def __init__(self, keyword: Token):
-		assert isinstance(keyword, Token)
 		self.keyword = keyword
+		self.depth = None  # set by the resolver for locals, None means global
+		self.slot = None
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.keyword, Token)
 
 	def accept(self, visitor):
 		return visitor.visit_this_expr(self)
 
-	
+
 class CallExpr(Expr):
-	def __init__(self, callee: Expr, paren: Token, arguments: List[Expr] or None):
-		assert isinstance(callee, Expr)
-		assert isinstance(paren, Token)
-		if arguments is not None:
-			assert isinstance(arguments, list)
+	__slots__ = ('callee', 'paren', 'arguments')
 
+	def __init__(self, callee: Expr, paren: Token, arguments: List[Expr]):
 		self.callee = callee
 		self.paren = paren
 		self.arguments = arguments
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.callee, Expr)
+		assert isinstance(self.paren, Token)
+		assert isinstance(self.arguments, list)
 
 	def accept(self, visitor):
 		return visitor.visit_call_expr(self)
 
 
 class GetExpr(Expr):
-	def __init__(self, object: Expr, name: Token):
-		assert isinstance(object, Expr)
-		assert isinstance(name, Token)
+	__slots__ = ('object', 'name', 'cached_shape', 'cached_index', 'cached_method')
 
+	def __init__(self, object: Expr, name: Token):
 		self.object = object
 		self.name = name
+		self.cached_shape = None  # inline cache, set by the interpreter
+		self.cached_index = None  # inline cache, set by the interpreter
+		self.cached_method = None  # inline cache, set by the interpreter
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.object, Expr)
+		assert isinstance(self.name, Token)
 
 	def accept(self, visitor):
 		return visitor.visit_get_expr(self)
 
 
 class SetExpr(Expr):
-	def __init__(self, object: Expr, name: Token, value: Expr):
-		assert isinstance(object, Expr)
-		assert isinstance(name, Token)
-		assert isinstance(value, Expr)
+	__slots__ = ('object', 'name', 'value', 'cached_shape', 'cached_index', 'cached_transition')
 
+	def __init__(self, object: Expr, name: Token, value: Expr):
 		self.object = object
 		self.name = name
 		self.value = value
+		self.cached_shape = None  # inline cache, set by the interpreter
+		self.cached_index = None  # inline cache, set by the interpreter
+		self.cached_transition = None  # inline cache, set by the interpreter
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.object, Expr)
+		assert isinstance(self.name, Token)
+		assert isinstance(self.value, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_set_expr(self)
 
 
 class LogicalExpr(Expr):
-	def __init__(self, left: Expr, operator: Token, right: Expr):
-		assert isinstance(left, Expr)
-		assert isinstance(right, Expr)
-		assert isinstance(operator, Token)
+	__slots__ = ('left', 'operator', 'right')
 
+	def __init__(self, left: Expr, operator: Token, right: Expr):
 		self.left = left
-		self.right = right
 		self.operator = operator
+		self.right = right
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.left, Expr)
+		assert isinstance(self.operator, Token)
+		assert isinstance(self.right, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_logical_expr(self)
 
 
 class VarExpr(Expr):
+	__slots__ = ('name', 'depth', 'slot')
+
 	def __init__(self, name: Token):
-		assert isinstance(name, Token)
 		self.name = name
+		self.depth = None  # set by the resolver for locals, None means global
+		self.slot = None
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.name, Token)
 
 	def accept(self, visitor):
 		return visitor.visit_var_expr(self)
 
 
 class AssignExpr(Expr):
+	__slots__ = ('name', 'value', 'depth', 'slot')
+
 	def __init__(self, name: Token, value: Expr):
-		assert isinstance(name, Token)
-		assert isinstance(value, Expr)
 		self.name = name
 		self.value = value
+		self.depth = None  # set by the resolver for locals, None means global
+		self.slot = None
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.name, Token)
+		assert isinstance(self.value, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_assign_expr(self)
 
 
 class Binary(Expr):
-	def __init__(self, left: Expr, operator: Token, right: Expr):
-		assert isinstance(left, Expr)
-		assert isinstance(operator, Token)
-		assert isinstance(right, Expr)
+	__slots__ = ('left', 'operator', 'right')
 
+	def __init__(self, left: Expr, operator: Token, right: Expr):
 		self.left = left
 		self.operator = operator
 		self.right = right
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.left, Expr)
+		assert isinstance(self.operator, Token)
+		assert isinstance(self.right, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_binary_expr(self)
 
 
 class Grouping(Expr):
-	def __init__(self, expression: Expr):
-		assert isinstance(expression, Expr)
+	__slots__ = ('expression',)
 
+	def __init__(self, expression: Expr):
 		self.expression = expression
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.expression, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_grouping_expr(self)
 
 
 class Literal(Expr):
-	def __init__(self, value: object):
-		assert isinstance(value, object)
+	__slots__ = ('value',)
 
+	def __init__(self, value: object):
 		self.value = value
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		pass
 
 	def accept(self, visitor):
 		return visitor.visit_literal_expr(self)
 
 
 class Unary(Expr):
-	def __init__(self, operator: Token, right: Expr):
-		assert isinstance(operator, Token)
-		assert isinstance(right, Expr)
+	__slots__ = ('operator', 'right')
 
+	def __init__(self, operator: Token, right: Expr):
 		self.operator = operator
 		self.right = right
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.operator, Token)
+		assert isinstance(self.right, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_unary_expr(self)
-
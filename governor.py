@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+from lox_token import Token
+from runtime_error import LoxRuntimeError
+import environment
+import lox_instance
+
+# steps between two checks of the limits, a step is a loop iteration or a call
+CHECK_INTERVAL = 1000
+# countdown of an interpreter that has no limits to check, never reached
+NO_CHECK = 1 << 62
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+# (pid, descriptor) of /proc/self/statm, kept open since reading it again costs a tenth of opening it on every check;
+# /proc/self is resolved when opened, so a forked process opens its own
+statm = None
+
+
+def memory_in_use() -> int:
+    """ Resident memory of the process in bytes, or its peak where the current value cannot be read """
+    global statm
+    try:
+        if statm is None or statm[0] != os.getpid():
+            statm = (os.getpid(), os.open('/proc/self/statm', os.O_RDONLY))
+        return int(os.pread(statm[1], 128, 0).split()[1]) * PAGE_SIZE
+    except (AttributeError, OSError):  # no pread on windows
+        import resource  # not available on windows
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, kilobytes elsewhere
+
+
+class ResourceLimitError(LoxRuntimeError):
+    """ Raised when a run goes past one of its Limits, usage holds what the run had consumed by then """
+
+    def __init__(self, operator: Token, message: str, usage: dict):
+        super().__init__(operator, message)
+        self.usage = usage
+
+
+class Limits:
+    """
+        Resources a run may use, None for no limit
+        steps counts loop iterations and calls, every loop or recursion that does not end runs into it.
+        allocations counts the environments and instances created over the whole run, whether or not they are
+        still alive, so it bounds the work a run does rather than what it keeps; memory is the bytes the process
+        grew by.
+        Limits are checked every CHECK_INTERVAL steps, so a run can go a little past timeout, memory
+        and allocations before it is stopped
+    """
+
+    def __init__(self, steps: int | None = None, timeout: float | None = None, allocations: int | None = None,
+                 memory: int | None = None):
+        self.steps = steps
+        self.timeout = timeout  # seconds
+        self.allocations = allocations
+        self.memory = memory  # bytes
+
+    def __bool__(self):
+        return any(limit is not None for limit in (self.steps, self.timeout, self.allocations, self.memory))
+
+
+class Governor:
+    """
+        Enforces Limits on the runs of an interpreter
+        The interpreter counts steps down from the interval handed out by check(), and only calls check()
+        again when the countdown reaches zero, so a step costs a decrement and a test
+        Environments and instances are counted by the process, so the governor only adds up what was created
+        while its interpreter was running: from attach() or resume() to pause() or detach(). Interpreters that
+        take turns, like the sessions of async_lox, each get their own count that way
+    """
+
+    def __init__(self, limits: Limits, interval: int = CHECK_INTERVAL):
+        self.limits = limits
+        self.check_interval = interval
+        self.steps = 0
+        self.interval = 0  # steps handed to the interpreter by the last check
+        self.start = None
+        self.end = None  # when the interpreter was last detached
+        self.allocations = 0  # created by the interpreter up to the last pause() or detach()
+        self.allocated = None  # allocated() when the interpreter last started running, None while it does not
+        self.memory = None
+
+    def attach(self, interpreter):
+        if self.start is None:
+            # the budget covers every part of a run, the declarations of a pipelined file included
+            self.start = time.monotonic()
+            self.memory = memory_in_use() if self.limits.memory is not None else 0
+        self.end = None
+        self.resume()
+        interpreter.governor = self
+        interpreter.countdown = self.next_interval()
+
+    def detach(self, interpreter):
+        self.steps += self.interval - interpreter.countdown
+        self.interval = 0
+        self.end = time.monotonic()
+        self.pause()
+        interpreter.governor = None
+        interpreter.countdown = NO_CHECK
+
+    def resume(self):
+        """ The interpreter starts running, what the process allocates from now on is its own """
+        self.allocated = allocated()
+
+    def pause(self):
+        """ The interpreter stops running, other code may allocate until it resumes """
+        if self.allocated is not None:
+            self.allocations += allocated() - self.allocated
+            self.allocated = None
+
+    def allocations_used(self) -> int:
+        if self.allocated is None:
+            return self.allocations
+        return self.allocations + allocated() - self.allocated
+
+    def next_interval(self) -> int:
+        self.interval = self.check_interval
+        if self.limits.steps is not None:
+            self.interval = max(1, min(self.check_interval, self.limits.steps - self.steps + 1))
+        return self.interval
+
+    def check(self, token: Token) -> int:
+        """ Raises a ResourceLimitError when a limit was passed, returns the steps until the next check """
+        self.steps += self.interval
+        self.interval = 0
+        limits = self.limits
+        if limits.steps is not None and self.steps > limits.steps:
+            self.exceeded(token, f'Step limit of {limits.steps} exceeded')
+        if limits.timeout is not None and time.monotonic() - self.start > limits.timeout:
+            self.out_of_time(token)
+        if limits.allocations is not None and self.allocations_used() > limits.allocations:
+            self.exceeded(token, f'Allocation limit of {limits.allocations} exceeded')
+        if limits.memory is not None and memory_in_use() - self.memory > limits.memory:
+            self.exceeded(token, f'Memory limit of {limits.memory} bytes exceeded')
+        return self.next_interval()
+
+    def time_left(self, seconds: float) -> float:
+        """ seconds, or less when the time limit comes first """
+        if self.limits.timeout is None:
+            return seconds
+        return max(0.0, min(seconds, self.start + self.limits.timeout - time.monotonic()))
+
+    def out_of_time(self, token: Token | None):
+        self.exceeded(token, f'Time limit of {self.limits.timeout} s exceeded')
+
+    def exceeded(self, token: Token | None, message: str):
+        usage = self.usage()
+        raise ResourceLimitError(token, f'{message} after {usage["steps"]} steps and {usage["seconds"]:.3f} s', usage)
+
+    def usage(self) -> dict:
+        """ What the runs consumed so far, steps are exact once the interpreter is detached """
+        if self.start is None:
+            return {'steps': 0, 'seconds': 0.0, 'allocations': 0, 'memory': 0 if self.limits.memory is not None else None}
+        return {
+            'steps': self.steps,
+            'seconds': (time.monotonic() if self.end is None else self.end) - self.start,
+            'allocations': self.allocations_used(),
+            'memory': memory_in_use() - self.memory if self.limits.memory is not None else None,
+        }
+
+
+def allocated() -> int:
+    return environment.allocated + lox_instance.created
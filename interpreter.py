@@ -1,37 +1,42 @@
-import time
-from expr import Expr, AssignExpr, LogicalExpr, GetExpr, SetExpr
+import sys
+from expr import Expr, AssignExpr, CallExpr, LogicalExpr, GetExpr, SetExpr
 from lox_token import TokenType, Token
 from lox_class import LoxClass
 from lox_instance import LoxInstance
+from lox_collections import COLLECTIONS
 from runtime_error import LoxRuntimeError
 from stmt import PrintStatement, ExpressionStatement, VarStatement, Stmt, BlockStatement, IfStatement, \
     WhileStatement, FunctionStatement, ReturnStatement, ClassStatement
 from typing import List
-from environment import Environment
+from environment import Environment, GlobalEnvironment
 from lox_callable import LoxCallable
-from lox_function import LoxFunction
-from lox_return import Return
+from lox_function import LoxFunction, TailCall
+from natives import NativeFunction, define_natives, describe
+from governor import NO_CHECK
+
+# deepest chain of lox calls before a 'Stack overflow' runtime error, calls in tail position do not count
+MAX_CALL_DEPTH = 10000
+# python frames allowed per lox call, a call nests a handful of visit_* frames for each statement and expression
+PYTHON_FRAMES_PER_CALL = 40
 
 
 class Interpreter:
 
-    def __init__(self, main):
+    def __init__(self, main, max_call_depth: int = MAX_CALL_DEPTH):
         self.main = main
-        self.globals = Environment()     # maintains a reference to outer most scope
-        self.environment = self.globals  # changes as the interpreter enters blocks
-        self.locals = {}                 # holds depth of resolved variables
-
-        class Clock(LoxCallable):
-            def arity(self):
-                return 0
-
-            def call(self, interpreter, arguments):
-                return time.time()
-
-            def __str__(self):
-                return "<native fn 'clock'>"
-
-        self.globals.define('clock', Clock())
+        self.call_depth = 0
+        self.calls = 0  # call expressions run, for metrics
+        self.governor = None  # enforces the resource limits of the run, see governor.py
+        self.countdown = NO_CHECK  # loop iterations and calls left before the governor checks the limits
+        self.output = None  # file that print statements write to, None for sys.stdout
+        self.random = None  # random.Random of the random natives, created on first use
+        self.max_call_depth = max_call_depth
+        # the lox stack is checked by call_depth, python's own limit only needs to stay out of its way
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), max_call_depth * PYTHON_FRAMES_PER_CALL))
+        self.globals = GlobalEnvironment()  # maintains a reference to outer most scope
+        self.environment = self.globals     # changes as the interpreter enters blocks
+
+        define_natives(self)
     
     def interpret(self, statements: List[Stmt]):
         try:
@@ -44,32 +49,35 @@ class Interpreter:
         return expr.accept(self)
 
     def execute(self, stmt: Stmt):
-        stmt.accept(self)
+        """
+            Returns None, or a one element tuple holding the value of an executed 'return'
+            Statements that contain others pass that tuple on as soon as they get it, up to the function call
+        """
+        return stmt.accept(self)
 
     def execute_block(self, statements: list[Stmt], environment: Environment):
         previous = self.environment
         try:
             self.environment = environment
             for statement in statements:
-                self.execute(statement)
+                result = self.execute(statement)
+                if result is not None:
+                    return result
+            return None
         finally:
             self.environment = previous
 
-    def resolve(self, expr: Expr, depth: int):
-        self.locals[expr] = depth
-                             
     def visit_block_statement(self, stmt: BlockStatement):
-        self.execute_block(stmt.statements, Environment(self.environment))
+        return self.execute_block(stmt.statements, Environment(self.environment))
 
     def visit_class_statement(self, stmt: ClassStatement):
-        self.environment.define(stmt.name.lexeme, None)
         methods = {}
         for method in stmt.methods:
             is_initializer = method.name.lexeme == 'init'
             function = LoxFunction(method, self.environment, is_initializer)
             methods[method.name.lexeme] = function
         lox_class = LoxClass(stmt.name.lexeme, methods)
-        self.environment.assign(stmt.name, lox_class)
+        self.environment.define(stmt.name.lexeme, lox_class)
 
     def visit_expression_statement(self, stmt: ExpressionStatement):
         self.evaluate(stmt.expression)
@@ -83,21 +91,27 @@ class Interpreter:
     def visit_if_statement(self, if_statement: IfStatement):
         if_condition = self.evaluate(if_statement.condition)
         if self.is_truthy(if_condition):
-            self.execute(if_statement.then_branch)
+            return self.execute(if_statement.then_branch)
         elif if_statement.else_branch is not None:
-            self.execute(if_statement.else_branch)
+            return self.execute(if_statement.else_branch)
         return None
 
     def visit_print_statement(self, stmt: PrintStatement):
         value = self.evaluate(stmt.expression)
-        print(value)
+        print(value, file=self.output)
         return None
 
     def visit_return_statement(self, stmt: ReturnStatement):
         value = None
-        if stmt.value is not None:
+        if stmt.value.__class__ is CallExpr:
+            # a call in tail position, handed to the caller instead of run here so the python stack does not grow
+            call = self.prepare_call(stmt.value)
+            if call.__class__ is TailCall:
+                return call
+            value = call
+        elif stmt.value is not None:
             value = self.evaluate(stmt.value)
-        raise Return(value)
+        return (value,)
 
     def visit_var_statement(self, stmt: VarStatement):
         value = None
@@ -108,14 +122,18 @@ class Interpreter:
 
     def visit_while_statement(self, stmt: WhileStatement):
         while self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            self.countdown -= 1
+            if not self.countdown:
+                self.check_limits(stmt.keyword)
+            result = self.execute(stmt.body)
+            if result is not None:
+                return result
         return None
 
     def visit_assign_expr(self, expr: AssignExpr):
         value = self.evaluate(expr.value)
-        distance = self.locals.get(expr)
-        if distance is not None:
-            self.environment.assign_at(distance, expr.name, value)
+        if expr.depth is not None:
+            self.environment.assign_at(expr.depth, expr.slot, value)
         else:
             self.globals.assign(expr.name, value)
         return value
@@ -141,7 +159,20 @@ class Interpreter:
         if not isinstance(object, LoxInstance):
             raise LoxRuntimeError(expr.name, 'Only instances have fields')
         value = self.evaluate(expr.value)
+        shape = object.shape
+        if shape is expr.cached_shape and shape is not None:
+            # inline cache hit, the field is either at a known slot or added through a known transition
+            if expr.cached_transition is None:
+                object.values[expr.cached_index] = value
+            else:
+                object.values.append(value)
+                object.shape = expr.cached_transition
+            return value
         object.set(expr.name, value)
+        if shape is not None and object.shape is not None:
+            expr.cached_shape = shape
+            expr.cached_index = object.shape.slots[expr.name.lexeme]
+            expr.cached_transition = None if object.shape is shape else object.shape
         return value
 
     def visit_grouping_expr(self, expr: Expr):
@@ -160,9 +191,8 @@ class Interpreter:
         return self.lookup_variable(expr.name, expr)
 
     def lookup_variable(self, name: Token, expr: Expr):
-        distance = self.locals.get(expr)
-        if distance is not None:
-            return self.environment.get_at(distance, name.lexeme)
+        if expr.depth is not None:
+            return self.environment.get_at(expr.depth, expr.slot)
         else:
             return self.globals.get(name)
             
@@ -200,7 +230,50 @@ class Interpreter:
                 return self.is_equal(left, right)
 
     def visit_call_expr(self, expr: Expr):
-        callee = self.evaluate(expr.callee)
+        call = self.prepare_call(expr)
+        if call.__class__ is not TailCall:
+            return call
+        if self.call_depth >= self.max_call_depth:
+            raise LoxRuntimeError(expr.paren, 'Stack overflow')
+        self.call_depth += 1
+        try:
+            return call.function.run(self, call.environment)
+        finally:
+            self.call_depth -= 1
+
+    def prepare_call(self, expr: CallExpr):
+        """
+            Evaluates the callee and the arguments of a call
+            Calls to lox functions are returned as a TailCall for the caller to run, so that a call in tail position
+            can be run by the LoxFunction.run loop of the function it returns from; anything else is called right
+            away and its value returned
+        """
+        self.calls += 1
+        self.countdown -= 1
+        if not self.countdown:
+            self.check_limits(expr.paren)
+        if expr.callee.__class__ is GetExpr:
+            # fused get and call, a method found through the inline cache runs without being bound first
+            get_expr = expr.callee
+            object = self.evaluate(get_expr.object)
+            if object.__class__ is LoxInstance and object.shape is not None:
+                if object.shape is not get_expr.cached_shape:
+                    self.cache_property(get_expr, object)
+                method = get_expr.cached_method
+                if method is not None:
+                    arguments = [self.evaluate(argument) for argument in expr.arguments]
+                    if len(arguments) != method.arity():
+                        raise LoxRuntimeError(expr.paren, f'Expected {method.arity()} arguments but got {len(arguments)}')
+                    return TailCall(method, Environment(Environment(method.closure, [object]), arguments))
+            elif object.__class__ in COLLECTIONS:
+                method = object.methods.get(get_expr.name.lexeme)
+                if method is not None:
+                    return self.call_native_function(expr, method, object)
+            callee = self.get_property(get_expr, object)
+        else:
+            callee = self.evaluate(expr.callee)
+            if callee.__class__ is NativeFunction:
+                return self.call_native_function(expr, callee)
         if not isinstance(callee, LoxCallable):
             raise LoxRuntimeError(callee, 'Can only call functions and classes')
         arguments = []
@@ -209,15 +282,75 @@ class Interpreter:
 
         if len(arguments) != callee.arity():
             raise LoxRuntimeError(expr.paren, f'Expected {callee.arity()} arguments but got {len(arguments)}')
-        
-        return callee.call(self, arguments)
+
+        if callee.__class__ is LoxFunction:
+            # parameters take the first slots of the function's scope, in order
+            return TailCall(callee, Environment(callee.closure, arguments))
+        # classes and memoized functions run lox code nested in this call, also when it is in tail position
+        if self.call_depth >= self.max_call_depth:
+            raise LoxRuntimeError(expr.paren, 'Stack overflow')
+        self.call_depth += 1
+        try:
+            return callee.call(self, arguments)
+        except LoxRuntimeError as error:
+            if error.operator is None:
+                error.operator = expr.paren
+            raise
+        finally:
+            self.call_depth -= 1
+
+    def call_native_function(self, expr: CallExpr, callee: NativeFunction, *receiver):
+        """
+            Calls a registered python function with the argument values, no environment or lox frame is set up
+            The methods of lists and maps get the list or map as receiver, ahead of the arguments
+        """
+        arguments = [self.evaluate(argument) for argument in expr.arguments]
+        if len(arguments) != callee.parameter_count:
+            raise LoxRuntimeError(expr.paren, f'Expected {callee.parameter_count} arguments but got {len(arguments)}')
+        try:
+            return callee.function(*receiver, *arguments)
+        except LoxRuntimeError as error:
+            if error.operator is None:
+                error.operator = expr.paren
+            raise
+
+    def check_limits(self, token: Token):
+        """ Called each time the countdown reaches zero, raises once the run is past one of its limits """
+        if self.governor is None:
+            self.countdown = NO_CHECK
+        else:
+            self.countdown = self.governor.check(token)
 
     def visit_get_expr(self, expr: GetExpr):
-        object = self.evaluate(expr.object)
+        return self.get_property(expr, self.evaluate(expr.object))
+
+    def get_property(self, expr: GetExpr, object):
         if isinstance(object, LoxInstance):
+            shape = object.shape
+            if shape is not expr.cached_shape or shape is None:
+                if shape is None:
+                    return object.get(expr.name)  # fields kept in a dict, nothing to cache
+                self.cache_property(expr, object)
+            if expr.cached_index is not None:
+                return object.values[expr.cached_index]
+            if expr.cached_method is not None:
+                return expr.cached_method.bind(object)
+            raise LoxRuntimeError(expr.name, f'Undefined property: {expr.name.lexeme}')
+        if object.__class__ in COLLECTIONS:
             return object.get(expr.name)
         raise LoxRuntimeError(expr.name, 'Only instances have properties')
 
+    def cache_property(self, expr: GetExpr, instance: LoxInstance):
+        """
+            Fills the inline cache of expr for the shape of instance
+            Shapes belong to a single class and fix which fields exist, so the shape alone decides whether
+            the name is a field, and at which slot, or a method of the class
+        """
+        key = expr.name.lexeme
+        expr.cached_shape = instance.shape
+        expr.cached_index = instance.shape.slots.get(key)
+        expr.cached_method = instance.lox_class.find_method(key) if expr.cached_index is None else None
+
 
     def is_truthy(self, value):
         """
@@ -247,13 +380,9 @@ class Interpreter:
             raise LoxRuntimeError(operator, 'Operands must be numbers')
 
     def stringify(self, value):
-        if value is None:
-            return 'nil'
-        if isinstance(value, float):
-            text = str(value)
-            if text.endswith('.0'):
-                text = text[:-2]
-            return text
-        return str(value)
+        """ Text of value as str() writes it, lists and maps write their items the same way """
+        if isinstance(value, str):
+            return value
+        return describe(value)
 
            
@@ -1,5 +1,10 @@
 from lox_callable import LoxCallable
 from lox_instance import LoxInstance
+from shape import Shape
+
+# past these limits instances stop sharing shapes and keep their fields in a dict
+MAX_SHAPES = 256  # per class, reached when fields are added in many different orders
+MAX_FIELDS = 64   # per instance
 
 class LoxClass(LoxCallable):
     def __init__(self, name: str, methods: dict):
@@ -8,6 +13,19 @@ class LoxClass(LoxCallable):
 
         self.name = name
         self.methods = methods
+        self.shape = Shape({})  # shape of new instances, the root of the class' transition tree
+        self.shape_count = 1
+
+    def next_shape(self, shape: Shape, name: str) -> Shape | None:
+        """ Shape after adding the field name to shape, None once the class is past its shape limits """
+        next_shape = shape.transitions.get(name)
+        if next_shape is None:
+            if self.shape_count >= MAX_SHAPES or len(shape.slots) >= MAX_FIELDS:
+                return None
+            next_shape = Shape({**shape.slots, name: len(shape.slots)})
+            shape.transitions[name] = next_shape
+            self.shape_count += 1
+        return next_shape
 
     def find_method(self, method_name: str):
         if method_name in self.methods:
@@ -23,7 +41,7 @@ class LoxClass(LoxCallable):
 
     def arity(self):
         initializer = self.find_method('init')
-        if initializer:
+        if initializer is None:
             return 0
         return initializer.arity()
         
@@ -0,0 +1,258 @@
+import inspect
+import reprlib
+from lox_token import Token
+from natives import NativeFunction, native, describe, index
+from runtime_error import LoxRuntimeError
+
+# Growable lists and hash maps backed by python's list and dict, created with the natives List() and Map(), and
+# string builders created with StringBuilder()
+#
+#     var names = List();
+#     names.push("lox");
+#     var ages = Map();
+#     ages.set(names.get(0), 3);
+#
+# Their methods are NativeFunctions taking the list, map or builder as first argument; the engines call them directly
+# on obj.method(...) and only bind them when they are read as a value. Like instances, they are only equal to
+# themselves
+
+
+class LoxList:
+    __slots__ = ('items',)
+    methods = {}  # name -> NativeFunction, filled in by the method decorator below
+
+    def __init__(self, items: list):
+        self.items = items
+
+    def get(self, name: Token):
+        return get_method(self, name)
+
+    @reprlib.recursive_repr('[...]')
+    def __str__(self):
+        return '[' + ', '.join(describe(item) for item in self.items) + ']'
+
+
+class LoxMap:
+    """
+        Keys may be any value, lists, maps, instances and callables are compared by identity
+        Booleans are stored as TRUE and FALSE, since python's dict would take true for the key 1
+    """
+    __slots__ = ('entries',)
+    methods = {}
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, name: Token):
+        return get_method(self, name)
+
+    @reprlib.recursive_repr('{...}')
+    def __str__(self):
+        return '{' + ', '.join(f'{describe(from_key(key))}: {describe(value)}'
+                               for key, value in self.entries.items()) + '}'
+
+
+class LoxStringBuilder:
+    """
+        Text built from appended pieces in time linear in its length, where adding to a string with + copies the
+        whole string every time. The pieces are joined when the text is asked for, and kept joined
+    """
+    __slots__ = ('parts', 'length')
+    methods = {}
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def get(self, name: Token):
+        return get_method(self, name)
+
+    def text(self) -> str:
+        parts = self.parts
+        if len(parts) > 1:
+            parts[:] = [''.join(parts)]
+        return parts[0] if parts else ''
+
+    def __str__(self):
+        return self.text()
+
+
+class BoolKey:
+    __slots__ = ('value',)
+
+    def __init__(self, value: bool):
+        self.value = value
+
+
+TRUE = BoolKey(True)
+FALSE = BoolKey(False)
+COLLECTIONS = (LoxList, LoxMap, LoxStringBuilder)
+
+
+def get_method(collection, name: Token) -> NativeFunction:
+    """ The method name bound to collection, for obj.method read without calling it """
+    method = collection.methods.get(name.lexeme)
+    if method is None:
+        raise LoxRuntimeError(name, f'Undefined property: {name.lexeme}')
+    return method.bind(collection)
+
+
+def to_key(value):
+    if value.__class__ is bool:
+        return TRUE if value else FALSE
+    return value
+
+
+def from_key(key):
+    if key.__class__ is BoolKey:
+        return key.value
+    return key
+
+
+def method(collection_class, name: str | None = None):
+    """ Decorator registering a python function as a method of collection_class, the receiver is its first parameter """
+
+    def register(function):
+        key = name or function.__name__
+        collection_class.methods[key] = NativeFunction(key, function, len(inspect.signature(function).parameters) - 1)
+        return function
+    return register
+
+
+def position(items: list, value, name: str) -> int:
+    i = index(value, name)
+    if not 0 <= i < len(items):
+        raise LoxRuntimeError(None, f'{name}() index {i} out of range for length {len(items)}')
+    return i
+
+
+@native('List')
+def new_list():
+    return LoxList([])
+
+
+@native('Map')
+def new_map():
+    return LoxMap()
+
+
+@native('StringBuilder')
+def new_string_builder():
+    return LoxStringBuilder()
+
+
+# list methods
+
+@method(LoxList)
+def push(self, value):
+    self.items.append(value)
+
+
+@method(LoxList)
+def pop(self):
+    if not self.items:
+        raise LoxRuntimeError(None, 'pop() from an empty list')
+    return self.items.pop()
+
+
+@method(LoxList, 'get')
+def get_item(self, i):
+    items = self.items
+    return items[position(items, i, 'get')]
+
+
+@method(LoxList, 'set')
+def set_item(self, i, value):
+    items = self.items
+    items[position(items, i, 'set')] = value
+    return value
+
+
+@method(LoxList)
+def insert(self, i, value):
+    """ Puts value at i, moving the items from i on up by one, i may be the length to add at the end """
+    items = self.items
+    i = index(i, 'insert')
+    if not 0 <= i <= len(items):
+        raise LoxRuntimeError(None, f'insert() index {i} out of range for length {len(items)}')
+    items.insert(i, value)
+
+
+@method(LoxList)
+def remove(self, i):
+    items = self.items
+    return items.pop(position(items, i, 'remove'))
+
+
+@method(LoxList, 'length')
+def list_length(self):
+    return float(len(self.items))
+
+
+# map methods
+
+@method(LoxMap, 'get')
+def get_value(self, key):
+    """ The value of key, nil when the map has none """
+    return self.entries.get(to_key(key))
+
+
+@method(LoxMap, 'set')
+def set_value(self, key, value):
+    self.entries[to_key(key)] = value
+    return value
+
+
+@method(LoxMap)
+def has(self, key):
+    return to_key(key) in self.entries
+
+
+@method(LoxMap, 'remove')
+def remove_key(self, key):
+    """ Removes key and returns its value, nil when the map has none """
+    return self.entries.pop(to_key(key), None)
+
+
+@method(LoxMap, 'length')
+def map_length(self):
+    return float(len(self.entries))
+
+
+@method(LoxMap)
+def keys(self):
+    return LoxList([from_key(key) for key in self.entries])
+
+
+@method(LoxMap)
+def values(self):
+    return LoxList(list(self.entries.values()))
+
+
+# string builder methods
+
+@method(LoxStringBuilder)
+def append(self, text):
+    """ Adds text at the end and returns the builder, so that appends can be chained """
+    if text.__class__ is not str:
+        raise LoxRuntimeError(None, f'append() expects a string, got {describe(text)}')
+    self.parts.append(text)
+    self.length += len(text)
+    return self
+
+
+@method(LoxStringBuilder, 'length')
+def text_length(self):
+    return float(self.length)
+
+
+@method(LoxStringBuilder)
+def build(self):
+    """ The text appended so far """
+    return self.text()
+
+
+@method(LoxStringBuilder)
+def clear(self):
+    self.parts.clear()
+    self.length = 0
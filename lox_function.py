@@ -1,42 +1,49 @@
 from lox_callable import LoxCallable
 from stmt import FunctionStatement
-from environment import Environment
-from lox_return import Return
+from environment import Environment, GlobalEnvironment
+
+
+class TailCall:
+    """ A call to a lox function, with its arguments already in the environment it runs in """
+    __slots__ = ('function', 'environment')
+
+    def __init__(self, function, environment: Environment):
+        self.function = function
+        self.environment = environment
+
 
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration: FunctionStatement, closure: Environment, is_initializer: bool):
+    def __init__(self, declaration: FunctionStatement, closure: Environment | GlobalEnvironment, is_initializer: bool):
         assert isinstance(declaration, FunctionStatement)
-        assert isinstance(closure, Environment)
+        assert isinstance(closure, (Environment, GlobalEnvironment))
         assert isinstance(is_initializer, bool)
         self.declaration = declaration
         self.closure = closure
         self.is_initializer = is_initializer
         
     def call(self, interpreter, arguments: list):
-        environment = Environment(self.closure)
-
-        for i in range(len(self.declaration.params)):
-            param = self.declaration.params[i]
-            argument = arguments[i]
-            environment.define(param.lexeme, argument)
-
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except Return as return_value:
-            if self.is_initializer:
-                return self.closure.get_at(0, 'this')
-            return return_value.value
-
-        if self.is_initializer:
-            return self.closure.get_at(0, 'this')  # force return of 'this' for class initializers
+        # parameters take the first slots of the function's scope, in order
+        return self.run(interpreter, Environment(self.closure, list(arguments)))
+
+    def run(self, interpreter, environment: Environment):
+        # calls in tail position come back as a TailCall and run here in turn, so they do not nest
+        function = self
+        result = interpreter.execute_block(function.declaration.body, environment)
+        while result.__class__ is TailCall:
+            function = result.function
+            environment = result.environment
+            result = interpreter.execute_block(function.declaration.body, environment)
+        if function.is_initializer:
+            return environment.enclosing.get_at(0, 0)  # force return of 'this' for class initializers
+        if result is not None:
+            return result[0]
         return None
 
     def arity(self):
         return len(self.declaration.params)
 
     def bind(self, instance):
-        environment = Environment(self.closure)
-        environment.define('this', instance)
+        environment = Environment(self.closure, [instance])  # 'this' is the only slot of a bound method's scope
         return LoxFunction(self.declaration, environment, self.is_initializer)
 
     def __str__(self):
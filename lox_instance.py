@@ -1,21 +1,66 @@
 from runtime_error import LoxRuntimeError
 from lox_token import Token
 
+created = 0  # LoxInstances created by this process, read by metrics.py
+
 class LoxInstance:
+    """
+        Fields are stored in a list laid out by a shape shared with other instances of the class
+        Instances whose class ran out of shapes keep their fields in a dict instead, shape is None then
+    """
+    __slots__ = ('lox_class', 'shape', 'values')
+
     def __init__(self, lox_class):
+        global created
+        created += 1
         self.lox_class = lox_class
-        self.fields = {}
+        self.shape = lox_class.shape
+        self.values = []
 
     def get(self, name: Token):
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
-        method = self.lox_class.find_method(name.lexeme)
+        key = name.lexeme
+        if self.shape is None:
+            if key in self.values:
+                return self.values[key]
+        else:
+            index = self.shape.slots.get(key)
+            if index is not None:
+                return self.values[index]
+        method = self.lox_class.find_method(key)
         if method:
             return method.bind(self)
-        raise LoxRuntimeError(name, f'Undefined property: {name.lexeme}')
+        raise LoxRuntimeError(name, f'Undefined property: {key}')
 
     def set(self, name: Token, value):
-        self.fields[name.lexeme] = value
+        self.set_field(name.lexeme, value)
+
+    def set_field(self, key: str, value):
+        shape = self.shape
+        if shape is None:
+            self.values[key] = value
+            return
+        index = shape.slots.get(key)
+        if index is not None:
+            self.values[index] = value
+            return
+        next_shape = self.lox_class.next_shape(shape, key)
+        if next_shape is None:
+            self.values = dict(zip(shape.slots, self.values))
+            self.values[key] = value
+            self.shape = None
+            return
+        self.values.append(value)
+        self.shape = next_shape
+
+    def has_field(self, key: str) -> bool:
+        if self.shape is None:
+            return key in self.values
+        return key in self.shape.slots
+
+    def get_field(self, key: str):
+        if self.shape is None:
+            return self.values[key]
+        return self.values[self.shape.slots[key]]
 
     def __repr__(self):
         return f'{self.lox_class} instance'
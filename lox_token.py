@@ -43,6 +43,8 @@ class TokenType(Enum):
 
 
 class Token:
+    __slots__ = ('token_type', 'lexeme', 'literal', 'line')
+
     def __init__(self, token_type: TokenType, lexeme: str, literal: dict | None, line: int):
         self.token_type = token_type
         self.lexeme = lexeme
@@ -1,68 +1,236 @@
+import os
 import sys
-from scanner import Scanner
-from parser import Parser
+import time
+import argparse
+from scanner import FastScanner, StreamingScanner
+from parser import Parser, StreamingParser
 # from ast_printer import ASTPrinter
 from runtime_error import LoxRuntimeError
-from interpreter import Interpreter
+from interpreter import Interpreter, MAX_CALL_DEPTH
 from resolver import Resolver
+from optimizer import Optimizer
+from closure_compiler import ClosureInterpreter
+from vm import VirtualMachine
+from compile_cache import CompileCache
+from profiler import ProfilingInterpreter
+from metrics import Metrics
+from governor import Governor, Limits
+
+ENGINES = {
+    'tree': Interpreter,            # walks the AST with the visitor pattern
+    'closure': ClosureInterpreter,  # compiles the AST into python closures before running it
+    'vm': VirtualMachine,           # compiles the AST into bytecode for a stack machine
+}
 
 class Lox:
-    def __init__(self):
+    def __init__(self, engine: str = 'tree', pipeline: bool = False, cache: CompileCache | None = None,
+                 max_call_depth: int = MAX_CALL_DEPTH, profile: bool = False, stats: bool = False,
+                 limits: Limits | None = None):
         self.had_error = False
         self.had_runtime_error = False
-        self.interpreter = Interpreter(self)
+        self.metrics = Metrics(count_nodes=stats)  # phase timings and counters of everything this object ran
+        if profile:
+            self.interpreter = ProfilingInterpreter(self, max_call_depth)  # a tree engine timing calls and statements
+        else:
+            self.interpreter = ENGINES[engine](self, max_call_depth)
+        self.pipeline = pipeline  # run each top level declaration as soon as it is parsed
+        self.cache = cache  # resolved programs from earlier runs of the same source
+        self.limits = limits  # resources each run may use, unless run() or run_file() is given others
+        self.governor = None  # enforces the limits of the current run, its usage() stays readable after it
+        # kept from one declaration to the next when a program is resolved a piece at a time, by the prompt and
+        # execute_pipelined, so that later pieces see what earlier ones declared; None when resolved at once
+        self.resolver = None
 
-    def run_file(self, file_name):
+    def run_file(self, file_name, limits: Limits | None = None):
+        self.start_run(limits)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(file_name)
+            with self.metrics.phase('cache_load'):
+                statements = self.cache.load(cache_key)
+            if statements is not None:
+                # stored after resolution succeeded, so there is nothing left to check before running
+                self.metrics.parsed(statements)
+                self.interpret(statements)
+                return None
+            if self.pipeline:
+                cache_key = None  # pipelined declarations are dropped once they ran, there is no program to store
+
+        # the file is scanned as it is read and the parser pulls tokens one at a time,
+        # so the source text and the token list are never held in memory as a whole
         with open(file_name) as f:
-            read_data = f.read()
-        self.run(read_data)
+            scanner = StreamingScanner(f, self)
+            parser = StreamingParser(scanner.stream_tokens(), self)
+            if self.pipeline:
+                self.execute_pipelined(self.metrics.timed('scan_and_parse', parser.declarations()))
+            else:
+                with self.metrics.phase('scan_and_parse'):
+                    statements = parser.parse()
+                self.metrics.parsed(statements)
+                self.execute(statements, cache_key)
+        self.metrics.count('tokens', scanner.token_count)
         if self.had_error:
             sys.exit()
 
     def run_prompt(self):
+        self.resolver = Resolver(self.interpreter, self)
         while True:
             user_input = input("> ")
             if not len(user_input):
                 break
             self.run(user_input)
 
-    def run(self, data: str) -> None:
-        scanner = Scanner(data, self)
-        tokens = scanner.scan_tokens()
+    def run(self, data: str, limits: Limits | None = None) -> None:
+        self.start_run(limits)
+        with self.metrics.phase('scan'):
+            tokens = FastScanner(data, self).scan_tokens()
+        self.metrics.count('tokens', len(tokens))
+
+        with self.metrics.phase('parse'):
+            statements = Parser(tokens, self).parse()
+        self.metrics.parsed(statements)
+        self.execute(statements)
 
-        parser = Parser(tokens, self)
-        statements = parser.parse()
+    def execute(self, statements: list, cache_key: str | None = None) -> None:
         if self.had_error or self.had_runtime_error:
             return None
 
-        resolver = Resolver(self.interpreter, self)
-        resolver.resolve_list(statements)
+        with self.metrics.phase('resolve'):
+            (self.resolver or Resolver(self.interpreter, self)).resolve_list(statements)
 
         if self.had_error:
             return None # stop for resolution errors
 
-        self.interpreter.interpret(statements)
+        with self.metrics.phase('optimize'):
+            statements = Optimizer(self.interpreter).optimize_list(statements)
+
+        if cache_key is not None:
+            with self.metrics.phase('cache_store'):
+                self.cache.store(cache_key, statements)
+
+        self.interpret(statements)
+
+    def start_run(self, limits: Limits | None):
+        limits = limits or self.limits
+        self.governor = Governor(limits) if limits else None
+
+    def interpret(self, statements: list) -> None:
+        if self.governor is not None:
+            self.governor.attach(self.interpreter)
+        try:
+            with self.metrics.interpreting(self.interpreter):
+                self.interpreter.interpret(statements)
+        finally:
+            if self.governor is not None:
+                self.governor.detach(self.interpreter)
+
+    def execute_pipelined(self, declarations) -> None:
+        """
+            Resolves and runs each top level declaration as soon as it is parsed, then lets it go
+            Functions and classes keep the parts of the AST they need alive through their declarations
+            Declarations before a syntax error have already run when it is found, after it nothing more runs
+            but the rest of the file is still parsed so every syntax error gets reported
+        """
+        resolver = self.resolver = Resolver(self.interpreter, self)
+        optimizer = Optimizer(self.interpreter)
+        for statement in declarations:
+            if self.had_error:
+                continue
+            self.metrics.parsed([statement])
+            with self.metrics.phase('resolve'):
+                resolver.resolve_list([statement])
+            if self.had_error:
+                continue
+            with self.metrics.phase('optimize'):
+                statements = optimizer.optimize_list([statement])
+            self.interpret(statements)
+            if self.had_runtime_error:
+                return None
+
+    def wait(self, seconds: float) -> None:
+        """ Called by natives that block, like sleep(), for as long as they wait without running lox code """
+        time.sleep(seconds)
 
     def pylox_error(self, line_no: int, message: str) -> None:
         self.had_error = True
+        self.metrics.count('compile_errors')
         print("[line " + str(line_no) + "] Error: " + message)
 
     def runtime_error(self, error: LoxRuntimeError) -> None:
         self.had_runtime_error = True
+        self.metrics.count('runtime_errors')
         print(error.message + f'[line {error.operator.line}]')
 
-    def main(self):
-        if len(sys.argv) > 2:
-            print("Incorrect amount of arguments, usage: python3 main.py <lox script>")
-            sys.exit()
-        elif len(sys.argv) == 2:
-            self.run_file(sys.argv[1])
+    def main(self, script: str | None):
+        if script is not None:
+            self.run_file(script)
         else:
             self.run_prompt()
 
 def main():
-    interpreter = Lox()
-    interpreter.main()
+    arg_parser = argparse.ArgumentParser(description='Pylox - a Lox interpreter')
+    arg_parser.add_argument('script', nargs='?', help='lox script to run, starts a prompt when omitted')
+    arg_parser.add_argument('--engine', choices=ENGINES.keys(), default='tree', help='execution engine (default: tree)')
+    arg_parser.add_argument('--pipeline', action='store_true', help='run each top level declaration as soon as it is parsed')
+    arg_parser.add_argument('--cache', action='store_true', help='reuse the resolved program of an unchanged script')
+    arg_parser.add_argument('--cache-dir', help=f'cache location (default: {CompileCache.DIRECTORY_NAME} next to the script)')
+    arg_parser.add_argument('--cache-size', type=float, default=CompileCache.DEFAULT_MAX_BYTES / (1024 * 1024),
+                            help='cache size cap in MB, least recently used programs are evicted past it')
+    arg_parser.add_argument('--max-depth', type=int, default=MAX_CALL_DEPTH,
+                            help=f'deepest chain of calls before a stack overflow error (default: {MAX_CALL_DEPTH})')
+    arg_parser.add_argument('--profile', action='store_true',
+                            help='time every function and line, and print a report to stderr when the script ends')
+    arg_parser.add_argument('--profile-stacks', metavar='FILE',
+                            help='with --profile, also write the call stacks in the collapsed format of flame graph tools')
+    arg_parser.add_argument('--stats', action='store_true', help='print phase timings and counters as JSON to stderr on exit')
+    arg_parser.add_argument('--stats-file', metavar='FILE', help='write the --stats JSON to FILE instead')
+    arg_parser.add_argument('--max-steps', type=int, help='stop the script after this many loop iterations and calls')
+    arg_parser.add_argument('--timeout', type=float, help='stop the script after running this many seconds')
+    arg_parser.add_argument('--max-allocations', type=int,
+                            help='stop the script after it created this many environments and instances, freed ones included')
+    arg_parser.add_argument('--max-memory', type=float, help='stop the script once the process grew by this many MB')
+    arg_parser.add_argument('--serve', action='store_true',
+                            help='stay running and run the scripts sent as JSON lines on stdin, see server.py')
+    arg_parser.add_argument('--socket', metavar='PATH', help='with --serve, take requests on a unix socket instead of stdin')
+    args = arg_parser.parse_args()
+    memory = None if args.max_memory is None else int(args.max_memory * 1024 * 1024)
+    limits = Limits(args.max_steps, args.timeout, args.max_allocations, memory)
+    if args.serve:
+        if args.script is not None or args.profile or args.pipeline or args.cache:
+            arg_parser.error('--serve runs scripts sent to it and takes no script, --profile, --pipeline or --cache')
+        from server import LoxServer  # server.py imports this module
+        server = LoxServer(args.engine, args.max_depth, limits)
+        if args.socket is not None:
+            server.serve_socket(args.socket)
+        else:
+            server.serve_stdio()
+        return None
+    if args.socket is not None:
+        arg_parser.error('--socket needs --serve')
+    if args.profile and args.engine != 'tree':
+        arg_parser.error('--profile is only available with the tree engine')
+    if args.profile_stacks and not args.profile:
+        arg_parser.error('--profile-stacks needs --profile')
+
+    cache = None
+    if args.cache and args.script is not None:
+        directory = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.script)), CompileCache.DIRECTORY_NAME)
+        cache = CompileCache(directory, int(args.cache_size * 1024 * 1024))
+
+    stats = args.stats or args.stats_file is not None
+    interpreter = Lox(args.engine, args.pipeline, cache, args.max_depth, args.profile, stats, limits)
+    try:
+        interpreter.main(args.script)
+    finally:
+        if args.stats_file is not None:
+            with open(args.stats_file, 'w') as f:
+                interpreter.metrics.dump(f)
+        elif stats:
+            interpreter.metrics.dump(sys.stderr)
+        if args.profile:
+            interpreter.interpreter.report(sys.stderr)
+            if args.profile_stacks:
+                interpreter.interpreter.write_collapsed(args.profile_stacks)
 
 if __name__ == "__main__":
     main()
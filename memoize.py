@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from lox_callable import LoxCallable
+from lox_class import LoxClass
+from lox_function import LoxFunction
+from runtime_error import LoxRuntimeError
+from stmt import FunctionStatement
+
+# argument types a call can be cached for, the class is part of the key since 1 == true in python
+CACHEABLE = frozenset((float, str, bool, type(None)))
+MISSING = object()
+
+
+class MemoizedFunction(LoxCallable):
+    """
+        Serves the calls of a pure lox function with number, string, bool and nil arguments from an LRU cache
+        When the program is resolved a piece at a time, as on the prompt or with --pipeline, a piece resolved after
+        memoize() accepted the function may make it impure, so it is checked again on every call
+    """
+
+    def __init__(self, function: LoxCallable, declaration: FunctionStatement, maxsize: int, recheck: bool):
+        self.function = function
+        self.declaration = declaration
+        self.name = declaration.name.lexeme
+        self.maxsize = maxsize
+        self.recheck = recheck
+        self.cache = OrderedDict()  # least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0  # calls with arguments that cannot be cached
+
+    def call(self, interpreter, arguments: list):
+        if self.recheck:
+            impurity = find_impurity(interpreter, self.declaration)
+            if impurity is not None:
+                raise LoxRuntimeError(None, f'Cannot memoize {self.name} any more, {impurity}')
+        classes = tuple(argument.__class__ for argument in arguments)
+        if not CACHEABLE.issuperset(classes):
+            self.bypassed += 1
+            return self.function.call(interpreter, arguments)
+        key = classes + tuple(arguments)
+        value = self.cache.get(key, MISSING)
+        if value is not MISSING:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return value
+        self.misses += 1
+        value = self.function.call(interpreter, arguments)
+        self.cache[key] = value
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return value
+
+    def arity(self):
+        return self.function.arity()
+
+    def __str__(self):
+        return f'<memoized fn {self.name}: {self.hits} hits, {self.misses} misses, {len(self.cache)} cached>'
+
+
+class Memoize(LoxCallable):
+    """
+        memoize(fn, maxsize) returns fn wrapped in a MemoizedFunction holding up to maxsize results
+        Functions the resolver found to depend on more than their arguments are refused
+    """
+
+    def call(self, interpreter, arguments: list):
+        function, maxsize = arguments
+        declaration = declaration_of(function)
+        if declaration is None:
+            raise LoxRuntimeError(None, f'Can only memoize lox functions, got {function}')
+        name = declaration.name.lexeme
+        if function.is_initializer:
+            raise LoxRuntimeError(None, f'Cannot memoize the initializer {name}')
+        impurity = find_impurity(interpreter, declaration)
+        if impurity is not None:
+            raise LoxRuntimeError(None, f'Cannot memoize {name}, {impurity}')
+        if not isinstance(maxsize, float) or maxsize < 1 or not maxsize.is_integer():
+            raise LoxRuntimeError(None, 'memoize() maxsize must be a positive whole number')
+        return MemoizedFunction(function, declaration, int(maxsize), interpreter.main.resolver is not None)
+
+    def arity(self):
+        return 2
+
+    def __str__(self):
+        return "<native fn 'memoize'>"
+
+
+def declaration_of(function) -> FunctionStatement | None:
+    """ The declaration of a lox function of any engine, None for other values """
+    from vm import VMFunction  # imported here, vm imports the interpreter that registers memoize
+
+    if isinstance(function, LoxFunction):
+        return function.declaration
+    if isinstance(function, VMFunction):
+        return function.proto.declaration
+    return None
+
+
+def find_impurity(interpreter, declaration: FunctionStatement, seen: set | None = None) -> str | None:
+    """
+        Why the function declared by declaration depends on more than its arguments, None when it does not
+        The functions it calls are followed; the globals among them are looked up in the interpreter, so they are
+        judged by the values they have now, which stay theirs since assigning one would make its callers impure
+    """
+    from natives import NativeFunction  # natives registers memoize
+
+    if declaration.impurity is not None:
+        return declaration.impurity
+    seen = set() if seen is None else seen
+    seen.add(declaration)
+    for name, callee in declaration.callees or ():
+        if callee is None:
+            value = interpreter.globals.values.get(name)
+            if value.__class__ is MemoizedFunction:
+                value = value.function
+            if isinstance(value, NativeFunction):
+                if value.impurity is not None:
+                    return value.impurity
+                continue
+            if isinstance(value, LoxClass):
+                return f"it creates instances of '{name}'"
+            callee = declaration_of(value)
+            if callee is None:
+                continue  # calling it is an error, or a native like memoize() that only depends on its arguments
+        if callee in seen:
+            continue
+        impurity = find_impurity(interpreter, callee, seen)
+        if impurity is not None:
+            return f'it calls {name}(), which {impurity.removeprefix("it ")}'
+    return None
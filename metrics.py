@@ -0,0 +1,84 @@
+import json
+import time
+from contextlib import contextmanager
+from expr import Expr
+from stmt import Stmt
+import environment
+import lox_instance
+
+DONE = object()
+COUNTERS = ['tokens', 'ast_nodes', 'environments', 'calls', 'instances', 'compile_errors', 'runtime_errors']
+
+
+def count_nodes(statements: list) -> int:
+    """ Expression and statement nodes in statements, the bodies of functions and classes included """
+    count = 0
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if node.__class__ is list:
+            stack.extend(node)
+        elif isinstance(node, (Expr, Stmt)):
+            count += 1
+            stack.extend(getattr(node, name) for name in node.__slots__)
+    return count
+
+
+class Metrics:
+    """
+        Seconds spent in each phase of running lox code and counters of what those phases did, summed over
+        every run of one Lox object (a file, or each line typed at the prompt)
+        Phases: scan, parse, resolve, optimize, interpret; a streamed file is scanned while it is parsed so both
+        are timed as scan_and_parse, and a program loaded from the compile cache is timed as cache_load
+    """
+
+    def __init__(self, count_nodes: bool = False):
+        self.phases = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.count_nodes = count_nodes  # walking the AST after it is parsed takes time, only done for --stats
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def timed(self, name: str, iterator):
+        """ Yields the items of iterator, timing the work of producing each one as the phase name """
+        iterator = iter(iterator)
+        while True:
+            with self.phase(name):
+                item = next(iterator, DONE)
+            if item is DONE:
+                return
+            yield item
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def parsed(self, statements: list):
+        if self.count_nodes:
+            self.count('ast_nodes', count_nodes(statements))
+
+    @contextmanager
+    def interpreting(self, interpreter):
+        """ Times running code on interpreter and counts the calls, environments and instances it made """
+        calls = interpreter.calls
+        environments = environment.allocated
+        instances = lox_instance.created
+        try:
+            with self.phase('interpret'):
+                yield
+        finally:
+            self.count('calls', interpreter.calls - calls)
+            self.count('environments', environment.allocated - environments)
+            self.count('instances', lox_instance.created - instances)
+
+    def to_dict(self) -> dict:
+        return {'phases': dict(self.phases), 'counters': dict(self.counters)}
+
+    def dump(self, file):
+        json.dump(self.to_dict(), file, indent=2)
+        file.write('\n')
@@ -0,0 +1,276 @@
+import functools
+import inspect
+import math
+import random
+import time
+from lox_callable import LoxCallable
+from memoize import Memoize
+from runtime_error import LoxRuntimeError
+
+# Python functions callable from lox, registered with the native decorator and defined in the globals of every
+# interpreter by define_natives
+#
+#     @native('sqrt')
+#     def square_root(x):
+#         return math.sqrt(number(x, 'sqrt'))
+#
+# Natives get lox values (float, str, bool, None, instances and callables) and must return one. A native raises
+# LoxRuntimeError(None, message) for bad arguments, the call site fills in where the call was
+
+NATIVES = {}  # name -> LoxCallable, the standard library
+
+
+class NativeFunction(LoxCallable):
+    """
+        A python function called with the arguments as they are, the engines call it directly without setting up
+        an environment or a lox call frame
+        A native using the interpreter, for state of its own like the random generator, gets it bound as its first
+        argument when it is defined in the interpreter's globals
+    """
+
+    def __init__(self, name: str, function, parameter_count: int, uses_interpreter: bool = False,
+                 impurity: str | None = None):
+        self.name = name
+        self.function = function
+        self.parameter_count = parameter_count
+        self.uses_interpreter = uses_interpreter
+        self.impurity = impurity  # why calling it gives different results for the same arguments, for memoize
+
+    def call(self, interpreter, arguments: list):
+        if self.uses_interpreter:
+            return self.function(interpreter, *arguments)
+        return self.function(*arguments)
+
+    def arity(self):
+        return self.parameter_count
+
+    def bind(self, first) -> 'NativeFunction':
+        """ This native with first, the interpreter or the receiver of a method, passed as its first argument """
+        return NativeFunction(self.name, functools.partial(self.function, first), self.parameter_count,
+                              impurity=self.impurity)
+
+    def __str__(self):
+        return f"<native fn '{self.name}'>"
+
+
+def native(name: str | None = None, uses_interpreter: bool = False, registry: dict = NATIVES,
+           impurity: str | None = None):
+    """
+        Decorator registering a python function as the native name, its arity is the number of its parameters
+        impurity tells memoize why a function calling the native cannot be cached, for natives like clock()
+    """
+
+    def register(function):
+        parameter_count = len(inspect.signature(function).parameters) - uses_interpreter
+        key = name or function.__name__
+        registry[key] = NativeFunction(key, function, parameter_count, uses_interpreter, impurity)
+        return function
+    return register
+
+
+def define_natives(interpreter, registry: dict = NATIVES):
+    """ Defines every native of registry in the globals of interpreter """
+    for name, callee in registry.items():
+        if isinstance(callee, NativeFunction) and callee.uses_interpreter:
+            callee = callee.bind(interpreter)
+        interpreter.globals.define(name, callee)
+
+
+def number(value, name: str) -> float:
+    if value.__class__ is not float:
+        raise LoxRuntimeError(None, f'{name}() expects a number, got {describe(value)}')
+    return value
+
+
+def string(value, name: str) -> str:
+    if value.__class__ is not str:
+        raise LoxRuntimeError(None, f'{name}() expects a string, got {describe(value)}')
+    return value
+
+
+def index(value, name: str) -> int:
+    if value.__class__ is not float or not value.is_integer():
+        raise LoxRuntimeError(None, f'{name}() expects a whole number, got {describe(value)}')
+    return int(value)
+
+
+def describe(value) -> str:
+    """ Text of a value as lox writes it, strings in quotes; used by str() and for the items of lists and maps """
+    if value is None:
+        return 'nil'
+    if value.__class__ is str:
+        return f'"{value}"'
+    if value.__class__ is bool:
+        return 'true' if value else 'false'
+    if value.__class__ is float:
+        text = str(value)
+        return text[:-2] if text.endswith('.0') else text
+    return str(value)
+
+
+def math_function(name: str, function, *arguments) -> float:
+    try:
+        return float(function(*(number(argument, name) for argument in arguments)))
+    except (ValueError, OverflowError) as error:
+        raise LoxRuntimeError(None, f'{name}() {error}')
+
+
+NATIVES['memoize'] = Memoize()
+
+
+# time
+
+@native(impurity='it calls clock()')
+def clock():
+    return time.time()
+
+
+@native(uses_interpreter=True, impurity='it calls sleep()')
+def sleep(interpreter, seconds):
+    """ Waits seconds, or stops the run when its time limit comes first; async sessions let others run meanwhile """
+    seconds = number(seconds, 'sleep')
+    if not seconds >= 0:
+        raise LoxRuntimeError(None, f'sleep() expects a non-negative number, got {describe(seconds)}')
+    governor = interpreter.governor
+    left = seconds if governor is None else governor.time_left(seconds)
+    interpreter.main.wait(left)
+    if left < seconds:
+        governor.out_of_time(None)
+
+
+# math
+
+@native('abs')
+def absolute(x):
+    return abs(number(x, 'abs'))
+
+
+@native()
+def floor(x):
+    x = number(x, 'floor')
+    return float(math.floor(x)) if math.isfinite(x) else x
+
+
+@native()
+def ceil(x):
+    x = number(x, 'ceil')
+    return float(math.ceil(x)) if math.isfinite(x) else x
+
+
+@native()
+def sqrt(x):
+    return math_function('sqrt', math.sqrt, x)
+
+
+@native()
+def pow(x, y):
+    return math_function('pow', math.pow, x, y)
+
+
+@native()
+def log(x):
+    return math_function('log', math.log, x)
+
+
+@native()
+def sin(x):
+    return math_function('sin', math.sin, x)
+
+
+@native()
+def cos(x):
+    return math_function('cos', math.cos, x)
+
+
+@native('min')
+def minimum(x, y):
+    return min(number(x, 'min'), number(y, 'min'))
+
+
+@native('max')
+def maximum(x, y):
+    return max(number(x, 'max'), number(y, 'max'))
+
+
+# strings
+
+@native('len')
+def length(text):
+    return float(len(string(text, 'len')))
+
+
+@native()
+def substring(text, start, end):
+    """ The characters of text from start up to, not including, end """
+    text = string(text, 'substring')
+    start = index(start, 'substring')
+    end = index(end, 'substring')
+    if not 0 <= start <= end <= len(text):
+        raise LoxRuntimeError(None, f'substring() range {start}..{end} out of bounds for length {len(text)}')
+    return text[start:end]
+
+
+@native()
+def index_of(text, part):
+    """ Position of the first occurrence of part in text, -1 when there is none """
+    return float(string(text, 'index_of').find(string(part, 'index_of')))
+
+
+@native()
+def upper(text):
+    return string(text, 'upper').upper()
+
+
+@native()
+def lower(text):
+    return string(text, 'lower').lower()
+
+
+@native()
+def trim(text):
+    return string(text, 'trim').strip()
+
+
+@native('str', uses_interpreter=True)
+def to_string(interpreter, value):
+    return interpreter.stringify(value)
+
+
+@native('num')
+def to_number(text):
+    """ The number written in text, nil when it is not one """
+    try:
+        return float(string(text, 'num'))
+    except ValueError:
+        return None
+
+
+# random numbers, each interpreter has a generator of its own so that seeding it makes its runs repeatable
+
+def generator(interpreter) -> random.Random:
+    if interpreter.random is None:
+        interpreter.random = random.Random()
+    return interpreter.random
+
+
+@native('random', uses_interpreter=True, impurity='it calls random()')
+def random_number(interpreter):
+    """ A number from 0 up to, not including, 1 """
+    return generator(interpreter).random()
+
+
+@native(uses_interpreter=True, impurity='it calls random_int()')
+def random_int(interpreter, low, high):
+    """ A whole number from low to high, both included """
+    low = index(low, 'random_int')
+    high = index(high, 'random_int')
+    if low > high:
+        raise LoxRuntimeError(None, f'random_int() range {low}..{high} is empty')
+    return float(generator(interpreter).randint(low, high))
+
+
+@native(uses_interpreter=True, impurity='it calls seed()')
+def seed(interpreter, value):
+    if value.__class__ not in (float, str):
+        raise LoxRuntimeError(None, f'seed() expects a number or a string, got {describe(value)}')
+    generator(interpreter).seed(value)
@@ -0,0 +1,147 @@
+from typing import List
+from expr import Expr, AssignExpr, Binary, CallExpr, GetExpr, Grouping, Literal, LogicalExpr, SetExpr, ThisExpr, \
+    Unary, VarExpr
+from stmt import Stmt, BlockStatement, ClassStatement, ExpressionStatement, FunctionStatement, IfStatement, \
+    PrintStatement, ReturnStatement, VarStatement, WhileStatement
+from lox_token import TokenType
+from runtime_error import LoxRuntimeError
+
+
+class Optimizer:
+    """
+        Rewrites the resolved AST before it runs
+        Constant Binary, Unary and Logical expressions are folded into literals, Grouping nodes are dropped and
+        if/while statements whose condition is a literal lose the branches that can never run.
+        Folding evaluates the expression with the interpreter itself, so the result is exactly what running it
+        would give; when that raises (e.g. -"str") the expression is kept and fails at runtime on its own line.
+        Nothing is added to or removed from a scope, so the depth/slot pairs of the resolver stay valid
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def optimize(self, node: Expr | Stmt):
+        return node.accept(self)
+
+    def optimize_list(self, statements: List[Stmt]) -> List[Stmt]:
+        optimized = []
+        for statement in statements:
+            statement = self.optimize(statement)
+            if statement is not None:  # pruned branch
+                optimized.append(statement)
+        return optimized
+
+    def optimize_branch(self, stmt: Stmt) -> Stmt:
+        # a branch must stay a statement, an empty block stands in for one that was pruned entirely
+        stmt = self.optimize(stmt)
+        return BlockStatement([]) if stmt is None else stmt
+
+    def fold(self, expr: Expr) -> Expr:
+        try:
+            return Literal(self.interpreter.evaluate(expr))
+        except (LoxRuntimeError, ArithmeticError, TypeError):
+            return expr
+
+    def visit_block_statement(self, stmt: BlockStatement):
+        # the block keeps its own environment even when it is left empty, its declarations are numbered in it
+        stmt.statements = self.optimize_list(stmt.statements)
+        return stmt
+
+    def visit_class_statement(self, stmt: ClassStatement):
+        for method in stmt.methods:
+            self.optimize(method)
+        return stmt
+
+    def visit_expression_statement(self, stmt: ExpressionStatement):
+        stmt.expression = self.optimize(stmt.expression)
+        return stmt
+
+    def visit_function_statement(self, stmt: FunctionStatement):
+        stmt.body = self.optimize_list(stmt.body)
+        return stmt
+
+    def visit_if_statement(self, stmt: IfStatement):
+        stmt.condition = self.optimize(stmt.condition)
+        if isinstance(stmt.condition, Literal):
+            if self.interpreter.is_truthy(stmt.condition.value):
+                return self.optimize(stmt.then_branch)
+            if stmt.else_branch is not None:
+                return self.optimize(stmt.else_branch)
+            return None
+        stmt.then_branch = self.optimize_branch(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self.optimize(stmt.else_branch)
+        return stmt
+
+    def visit_print_statement(self, stmt: PrintStatement):
+        stmt.expression = self.optimize(stmt.expression)
+        return stmt
+
+    def visit_return_statement(self, stmt: ReturnStatement):
+        if stmt.value is not None:
+            stmt.value = self.optimize(stmt.value)
+        return stmt
+
+    def visit_var_statement(self, stmt: VarStatement):
+        if stmt.initializer is not None:
+            stmt.initializer = self.optimize(stmt.initializer)
+        return stmt
+
+    def visit_while_statement(self, stmt: WhileStatement):
+        stmt.condition = self.optimize(stmt.condition)
+        if isinstance(stmt.condition, Literal) and not self.interpreter.is_truthy(stmt.condition.value):
+            return None
+        stmt.body = self.optimize_branch(stmt.body)
+        return stmt
+
+    def visit_assign_expr(self, expr: AssignExpr):
+        expr.value = self.optimize(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr: Binary):
+        expr.left = self.optimize(expr.left)
+        expr.right = self.optimize(expr.right)
+        if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+            return self.fold(expr)
+        return expr
+
+    def visit_call_expr(self, expr: CallExpr):
+        expr.callee = self.optimize(expr.callee)
+        expr.arguments = [self.optimize(argument) for argument in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr: GetExpr):
+        expr.object = self.optimize(expr.object)
+        return expr
+
+    def visit_grouping_expr(self, expr: Grouping):
+        return self.optimize(expr.expression)
+
+    def visit_literal_expr(self, expr: Literal):
+        return expr
+
+    def visit_logical_expr(self, expr: LogicalExpr):
+        expr.left = self.optimize(expr.left)
+        expr.right = self.optimize(expr.right)
+        if isinstance(expr.left, Literal):
+            # the left operand decides whether the right one runs, and the right one is the result when it does
+            short_circuits = self.interpreter.is_truthy(expr.left.value) == (expr.operator.token_type == TokenType.OR)
+            return expr.left if short_circuits else expr.right
+        return expr
+
+    def visit_set_expr(self, expr: SetExpr):
+        expr.object = self.optimize(expr.object)
+        expr.value = self.optimize(expr.value)
+        return expr
+
+    def visit_this_expr(self, expr: ThisExpr):
+        return expr
+
+    def visit_unary_expr(self, expr: Unary):
+        expr.right = self.optimize(expr.right)
+        if isinstance(expr.right, Literal):
+            return self.fold(expr)
+        return expr
+
+    def visit_var_expr(self, expr: VarExpr):
+        return expr
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Iterable, List
 from lox_token import Token, TokenType
 from expr import Literal, Binary, Unary, Grouping, VarExpr, AssignExpr, LogicalExpr, CallExpr, GetExpr, \
                  SetExpr, ThisExpr
@@ -66,6 +66,7 @@ class Parser:
         return self.expression_statement()
 
     def for_statement(self):
+        keyword = self.previous()
         self.consume(TokenType.LEFT_PAREN, "Expected '(' after for")
 
         initializer = None
@@ -92,7 +93,7 @@ class Parser:
             body = BlockStatement([body, ExpressionStatement(increment)])
         if condition is None:
             condition = Literal(True)
-        body = WhileStatement(condition, body)
+        body = WhileStatement(keyword, condition, body)
         if initializer is not None:
             body = BlockStatement([initializer, body])
         
@@ -131,11 +132,12 @@ class Parser:
         return VarStatement(name, initializer)
 
     def while_statement(self):
+        keyword = self.previous()
         self.consume(TokenType.LEFT_PAREN, "Expected '(' after if statement")
         condition = self.expression()
         self.consume(TokenType.RIGHT_PAREN, "Expected ')' after if statement")
         body = self.statement()
-        return WhileStatement(condition, body)
+        return WhileStatement(keyword, condition, body)
 
     def expression_statement(self):
         expr = self.expression()
@@ -350,4 +352,36 @@ class Parser:
                 case TokenType.RETURN:
                     return None
             self.advance()
-                
+
+
+class StreamingParser(Parser):
+    """
+        Parses tokens pulled one at a time from an iterator, such as StreamingScanner.stream_tokens()
+        Only the current token and the one before it are kept, the grammar never needs to look further
+    """
+
+    def __init__(self, tokens: Iterable[Token], interpreter):
+        self.tokens = iter(tokens)
+        self.interpreter = interpreter
+        self.current_token = next(self.tokens)
+        self.previous_token = None
+
+    def parse(self):
+        return list(self.declarations())
+
+    def declarations(self):
+        """ Yields top level declarations as soon as they are parsed """
+        while not self.is_end_of_file():
+            yield self.declaration()
+
+    def advance(self):
+        if not self.is_end_of_file():
+            self.previous_token = self.current_token
+            self.current_token = next(self.tokens)
+        return self.previous_token
+
+    def peek(self):
+        return self.current_token
+
+    def previous(self):
+        return self.previous_token
@@ -0,0 +1,147 @@
+import time
+from expr import Expr
+from interpreter import Interpreter, MAX_CALL_DEPTH
+from lox_token import Token
+from stmt import Stmt, ClassStatement, FunctionStatement
+
+SCRIPT = '<script>'  # frame of the code outside any function
+TOP_LINES = 20  # hot lines shown in the report
+
+
+def first_line(node) -> int | None:
+    """ Line of the first token found in node, walking its children in source order """
+    if isinstance(node, Token):
+        return node.line
+    if isinstance(node, list):
+        children = node
+    elif isinstance(node, (Expr, Stmt)):
+        children = (getattr(node, name) for name in node.__slots__)
+    else:
+        return None
+    for child in children:
+        line = first_line(child)
+        if line is not None:
+            return line
+    return None
+
+
+class FunctionStats:
+    __slots__ = ('calls', 'inclusive', 'exclusive', 'active')
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0  # only counted by the outermost of the recursive calls, so time is not counted twice
+        self.exclusive = 0.0
+        self.active = 0  # calls of the function currently running
+
+
+class ProfilingInterpreter(Interpreter):
+    """
+        Tree walking interpreter that times every lox call and every statement it runs
+        Calls are timed where the body of a function or method runs, which also catches the calls made by classes,
+        natives like memoize() and the tail calls run by LoxFunction.run. The plain Interpreter knows nothing of
+        this class, so running without --profile costs nothing
+    """
+
+    def __init__(self, main, max_call_depth: int = MAX_CALL_DEPTH):
+        super().__init__(main, max_call_depth)
+        self.bodies = {}  # id of a function body -> (body, 'name:line'), the body is kept so its id stays unique
+        self.functions = {}  # 'name:line' -> FunctionStats
+        self.stacks = {}  # tuple of 'name:line' from the script down -> exclusive seconds, for flame graphs
+        self.lines = {}  # line -> [statements run, exclusive seconds]
+        self.statement_lines = {}  # statement -> its line, None when it has no token
+        self.frames = []  # [stack, start, seconds in calls made from the frame] of each running call
+        self.child_time = [0.0]  # seconds in statements nested in each running statement
+
+    def register(self, stmt: FunctionStatement, name: str):
+        self.bodies[id(stmt.body)] = (stmt.body, f'{name}:{stmt.name.line}')
+
+    def interpret(self, statements: list[Stmt]):
+        self.enter(SCRIPT)
+        try:
+            super().interpret(statements)
+        finally:
+            self.leave()
+
+    def enter(self, name: str):
+        stack = self.frames[-1][0] + (name,) if self.frames else (name,)
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = FunctionStats()
+        stats.calls += 1
+        stats.active += 1
+        self.frames.append([stack, time.perf_counter(), 0.0])
+
+    def leave(self):
+        stack, start, children = self.frames.pop()
+        inclusive = time.perf_counter() - start
+        exclusive = inclusive - children
+        stats = self.functions[stack[-1]]
+        stats.active -= 1
+        if stats.active == 0:
+            stats.inclusive += inclusive
+        stats.exclusive += exclusive
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + exclusive
+        if self.frames:
+            self.frames[-1][2] += inclusive
+
+    def execute(self, stmt: Stmt):
+        if stmt in self.statement_lines:
+            line = self.statement_lines[stmt]
+        else:
+            line = self.statement_lines[stmt] = first_line(stmt)
+        self.child_time.append(0.0)
+        start = time.perf_counter()
+        try:
+            return stmt.accept(self)
+        finally:
+            elapsed = time.perf_counter() - start
+            exclusive = elapsed - self.child_time.pop()
+            self.child_time[-1] += elapsed
+            hits = self.lines.get(line)
+            if hits is None:
+                hits = self.lines[line] = [0, 0.0]
+            hits[0] += 1
+            hits[1] += exclusive
+
+    def execute_block(self, statements: list[Stmt], environment):
+        body = self.bodies.get(id(statements))
+        if body is None:
+            return super().execute_block(statements, environment)
+        self.enter(body[1])
+        try:
+            return super().execute_block(statements, environment)
+        finally:
+            self.leave()
+
+    def visit_function_statement(self, stmt: FunctionStatement):
+        self.register(stmt, stmt.name.lexeme)
+        return super().visit_function_statement(stmt)
+
+    def visit_class_statement(self, stmt: ClassStatement):
+        for method in stmt.methods:
+            self.register(method, f'{stmt.name.lexeme}.{method.name.lexeme}')
+        return super().visit_class_statement(stmt)
+
+    def report(self, file):
+        total = sum(stats.exclusive for stats in self.functions.values())
+        print(f'\n{"function":<32} {"calls":>10} {"inclusive s":>12} {"exclusive s":>12} {"%":>6}', file=file)
+        ranked = sorted(self.functions.items(), key=lambda item: item[1].exclusive, reverse=True)
+        for name, stats in ranked:
+            share = 100 * stats.exclusive / total if total else 0.0
+            print(f'{name:<32} {stats.calls:>10} {stats.inclusive:>12.6f} {stats.exclusive:>12.6f} {share:>6.1f}',
+                  file=file)
+
+        print(f'\n{"line":<10} {"statements":>12} {"exclusive s":>12} {"%":>6}', file=file)
+        ranked = sorted(self.lines.items(), key=lambda item: item[1][1], reverse=True)
+        for line, (hits, seconds) in ranked[:TOP_LINES]:
+            share = 100 * seconds / total if total else 0.0
+            print(f'{"?" if line is None else line:<10} {hits:>12} {seconds:>12.6f} {share:>6.1f}', file=file)
+
+    def write_collapsed(self, file_name: str):
+        """ Writes the stacks in the collapsed format of flamegraph.pl and speedscope, weighted in microseconds """
+        with open(file_name, 'w') as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                microseconds = round(seconds * 1_000_000)
+                if microseconds > 0:
+                    f.write(f'{";".join(stack)} {microseconds}\n')
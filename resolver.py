@@ -2,7 +2,8 @@ from typing import List, Union
 from enum import Enum, auto
 from stmt import Stmt, BlockStatement, VarStatement, FunctionStatement, ExpressionStatement, IfStatement, PrintStatement, \
                  ReturnStatement, WhileStatement, ClassStatement
-from expr import Expr, Binary, CallExpr, Grouping, Literal, LogicalExpr, Unary, GetExpr, SetExpr, ThisExpr
+from expr import Expr, AssignExpr, Binary, CallExpr, Grouping, Literal, LogicalExpr, Unary, GetExpr, SetExpr, ThisExpr, \
+    VarExpr
 
 
 
@@ -22,10 +23,20 @@ class Resolver:
     def __init__(self, interpreter, lox):
         self.interpreter = interpreter
         self.lox = lox
-        self.scopes = []
+        self.scopes = []  # name -> True once defined, False while only declared
+        self.slots = []   # name -> slot index in the environment created for the matching scope
         self.current_function = FunctionType.NONE
         self.current_class = ClassType.NONE
 
+        # memoize() needs to know which functions depend on more than their arguments, see mark_impure
+        self.functions = []        # (declaration, index of its scope) of the functions being resolved, innermost last
+        self.captures = []         # per scope: name -> functions that read the variable from inside them
+        self.assigned = []         # per scope: names assigned somewhere after their declaration
+        self.callables = []        # per scope: name -> declaration of the functions and classes declared in it
+        self.global_captures = {}
+        self.global_assigned = set()
+        self.global_declared = set()
+
     def visit_block_statement(self, stmt: BlockStatement):
         self.begin_scope()
         self.resolve_list(stmt.statements)
@@ -35,8 +46,12 @@ class Resolver:
         enclosing_class = self.current_class
         self.current_class = ClassType.CLASS
         self.declare(stmt.name)
+        self.define(stmt.name)
+        if len(self.scopes):
+            self.callables[-1][stmt.name.lexeme] = stmt
 
         self.begin_scope() # add 'this' to the scope of the class manually
+        self.slots[-1]['this'] = 0
         self.scopes[-1]['this'] = True
       
         for method in stmt.methods:
@@ -45,7 +60,6 @@ class Resolver:
             else:
                 declaration = FunctionType.METHOD
             self.resolve_function(method, declaration)
-        self.define(stmt.name)
 
         self.end_scope()
         self.current_class = enclosing_class
@@ -60,8 +74,13 @@ class Resolver:
         if self.current_class == ClassType.NONE:
             self.lox.pylox_error(expr.keyword.line, 'Cannot use "this" outside of a class')
         self.resolve_local(expr, expr.keyword)
+        self.mark_impure(self.scope_index(expr), "it uses 'this'")
 
     def visit_var_expr(self, expr: Expr):
+        self.resolve_variable(expr)
+        self.capture(expr.name.lexeme, self.scope_index(expr))
+
+    def resolve_variable(self, expr: VarExpr):
         if len(self.scopes) and self.scopes[-1].get(expr.name.lexeme) is False:
             self.interpreter.main.pylox_error(expr.name.line, 'Cannot read local variable in its own initializer')
         self.resolve_local(expr, expr.name)
@@ -69,10 +88,25 @@ class Resolver:
     def visit_assign_expr(self, expr: Expr):
         self.resolve(expr.value)  # first resolve any variables in assignment
         self.resolve_local(expr, expr.name)
+        if not self.memoizes(expr):
+            self.assign(expr.name.lexeme, self.scope_index(expr))
+
+    def memoizes(self, expr: AssignExpr) -> bool:
+        """ Whether expr is fib = memoize(fib, n), which puts a cache in front of the same function """
+        value = expr.value
+        if value.__class__ is not CallExpr or value.callee.__class__ is not VarExpr or not value.arguments:
+            return False
+        callee = value.callee
+        function = value.arguments[0]
+        return callee.name.lexeme == 'memoize' and callee.depth is None and 'memoize' not in self.global_declared \
+            and function.__class__ is VarExpr and function.name.lexeme == expr.name.lexeme \
+            and function.depth == expr.depth
 
     def visit_function_statement(self, stmt: FunctionStatement):
         self.declare(stmt.name)
         self.define(stmt.name)
+        if len(self.scopes):
+            self.callables[-1][stmt.name.lexeme] = stmt
         self.resolve_function(stmt, FunctionType.FUNCTION)
 
     def visit_expression_statement(self, stmt: ExpressionStatement):
@@ -85,6 +119,7 @@ class Resolver:
             self.resolve(stmt.else_branch)
 
     def visit_print_statement(self, stmt: PrintStatement):
+        self.mark_impure(-1, 'it prints')
         self.resolve(stmt.expression)
 
     def visit_return_statement(self, stmt: ReturnStatement):
@@ -104,12 +139,21 @@ class Resolver:
         self.resolve(expr.right)
 
     def visit_call_expr(self, expr: CallExpr):
+        # the callee is read like any other variable, so assigning or declaring it again makes the callers impure
         self.resolve(expr.callee)
+        if expr.callee.__class__ is VarExpr:
+            self.call(expr.callee)
         for argument in expr.arguments:
             self.resolve(argument)
 
     def visit_get_expr(self, expr: GetExpr):
         self.resolve(expr.object)
+        root = expr.object
+        while root.__class__ is GetExpr:
+            root = root.object
+        if root.__class__ is VarExpr:
+            # fields of an object from outside may change between two calls with the same arguments
+            self.mark_impure(self.scope_index(root), f"it reads a property of the outer variable '{root.name.lexeme}'")
 
     def visit_grouping_expr(self, expr: Grouping):
         self.resolve(expr.expression)
@@ -122,6 +166,7 @@ class Resolver:
         self.resolve(expr.right)
 
     def visit_set_expr(self, expr: SetExpr):
+        self.mark_impure(-1, 'it sets a property')
         self.resolve(expr.value)
         self.resolve(expr.object)
 
@@ -133,18 +178,23 @@ class Resolver:
         self.current_function = function_type
 
         self.begin_scope()
+        stmt.callees = []
+        self.functions.append((stmt, len(self.scopes) - 1))
         for param in stmt.params:
             self.declare(param)
             self.define(param)
         self.resolve_list(stmt.body)
+        self.functions.pop()
         self.end_scope()
 
         self.current_function = enclosing_function
 
     def resolve_local(self, expr, name):
-        for i, scope in enumerate(reversed(self.scopes)):
+        for i, scope in enumerate(reversed(self.slots)):
             if name.lexeme in scope:
-                self.interpreter.resolve(expr, i)
+                expr.depth = i
+                expr.slot = scope[name.lexeme]
+                return None
         
     def resolve_list(self, statements: List[Stmt]):
         for statement in statements:
@@ -153,20 +203,97 @@ class Resolver:
     def resolve(self, statement: Union[Expr, Stmt]):
         statement.accept(self)
 
+    def scope_index(self, expr) -> int:
+        """ Index in self.scopes of the scope a resolved variable was declared in, -1 for globals """
+        if expr.depth is None:
+            return -1
+        return len(self.scopes) - 1 - expr.depth
+
+    def mark_impure(self, outside: int, reason: str):
+        """
+            Records why the functions being resolved cannot be memoized, for those declared inside the scope at
+            index outside (-1 for all of them), the first reason found is kept
+            A function is impure when it prints, sets properties, uses 'this', assigns a variable declared outside
+            of it, reads one that is assigned anywhere, reads a property of one, creates instances, or calls an
+            outer variable that holds something else than a declared function; the functions it calls are checked
+            by memoize() through the callees recorded by call()
+        """
+        for function, scope in self.functions:
+            if scope > outside and function.impurity is None:
+                function.impurity = reason
+
+    def capture(self, name: str, index: int):
+        # reads from inside a function of a variable declared outside of it
+        functions = [function for function, scope in self.functions if scope > index]
+        if not functions:
+            return None
+        assigned = self.global_assigned if index < 0 else self.assigned[index]
+        if name in assigned:
+            self.mark_impure(index, f"it reads the variable '{name}', which is assigned elsewhere")
+            return None
+        captures = self.global_captures if index < 0 else self.captures[index]
+        captures.setdefault(name, []).extend(functions)
+
+    def call(self, callee: VarExpr):
+        """
+            Records a call on the functions being resolved that it calls out of, with the declaration of the callee
+            Globals are recorded without one, they are looked up when memoize() is called since they may be declared
+            after their callers; a global that is not a lox function, like clock(), is judged by its value then
+        """
+        name = callee.name.lexeme
+        index = self.scope_index(callee)
+        declaration = None if index < 0 else self.callables[index].get(name)
+        if declaration.__class__ is ClassStatement:
+            # every call returns a new instance, wherever the class was declared
+            self.mark_impure(-1, f"it creates instances of '{name}'")
+            return None
+        functions = [function for function, scope in self.functions if scope > index]
+        if not functions:
+            return None
+        if index >= 0 and declaration is None:
+            self.mark_impure(index, f"it calls the variable '{name}', which is not a declared function")
+            return None
+        for function in functions:
+            if (name, declaration) not in function.callees:
+                function.callees.append((name, declaration))
+
+    def assign(self, name: str, index: int):
+        self.mark_impure(index, f"it assigns the outer variable '{name}'")
+        assigned = self.global_assigned if index < 0 else self.assigned[index]
+        assigned.add(name)
+        captures = self.global_captures if index < 0 else self.captures[index]
+        for function in captures.pop(name, []):
+            if function.impurity is None:
+                function.impurity = f"it reads the variable '{name}', which is assigned elsewhere"
+
     def begin_scope(self):
         self.scopes.append({})
+        self.slots.append({})
+        self.captures.append({})
+        self.assigned.append(set())
+        self.callables.append({})
 
     def end_scope(self):
         self.scopes.pop()
+        self.slots.pop()
+        self.captures.pop()
+        self.assigned.pop()
+        self.callables.pop()
 
     def declare(self, name):
         if not len(self.scopes):
+            # redeclaring a global changes its value like an assignment
+            if name.lexeme in self.global_declared:
+                self.assign(name.lexeme, -1)
+            self.global_declared.add(name.lexeme)
             return None
         scope = self.scopes[-1]
         if name.lexeme in scope:
             self.lox.pylox_error(name.line, "Already a variable with this name in scope")
 
         scope[name.lexeme] = False
+        slots = self.slots[-1]
+        slots.setdefault(name.lexeme, len(slots))
 
     def define(self, name):
         if not len(self.scopes):
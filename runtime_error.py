@@ -1,7 +1,8 @@
 from lox_token import Token
 
 class LoxRuntimeError(Exception):
-    def __init__(self, operator: Token, message: str):
+    def __init__(self, operator: Token | None, message: str):
+        # natives have no token of their own, the call site fills in its paren when operator is None
         self.operator = operator
         self.message = message
         super().__init__(message)
@@ -1,3 +1,6 @@
+import codecs
+import gc
+import re
 from lox_token import Token, TokenType
 
 class Scanner:
@@ -178,4 +181,164 @@ class Scanner:
 
     def is_alphanumeric(self, c: str):
         return self.is_alpha(c) or self.is_digit(c)
-    
+
+
+# Operators and punctuation
+OPERATORS = {
+    '!=': TokenType.BANG_EQUAL,
+    '==': TokenType.EQUAL_EQUAL,
+    '<=': TokenType.LESS_EQUAL,
+    '>=': TokenType.GREATER_EQUAL,
+    '(': TokenType.LEFT_PAREN,
+    ')': TokenType.RIGHT_PAREN,
+    '{': TokenType.LEFT_BRACE,
+    '}': TokenType.RIGHT_BRACE,
+    ',': TokenType.COMMA,
+    '.': TokenType.DOT,
+    '-': TokenType.MINUS,
+    '+': TokenType.PLUS,
+    ';': TokenType.SEMICOLON,
+    '*': TokenType.STAR,
+    '/': TokenType.SLASH,
+    '!': TokenType.BANG,
+    '=': TokenType.EQUAL,
+    '<': TokenType.LESS,
+    '>': TokenType.GREATER,
+}
+
+# Each match is one lexeme with the blanks in front of it, newlines are matched in runs so lines can be counted
+LEXEME_PATTERN = re.compile(r'''
+    [ \t\r]*(
+        [A-Za-z_][A-Za-z0-9_]*     # identifiers and keywords
+      | [0-9]+(?:\.[0-9]+)?        # numbers
+      | [!=<>]=                    # two character operators
+      | "[^"]*"                    # strings
+      | //[^\n]*                   # comments
+      | \n+
+      | [^ \t\r]                   # everything else, including an unterminated '"'
+    )
+  | [ \t\r]+\Z                  # blanks ending the source, matched as an empty lexeme
+''', re.VERBOSE | re.DOTALL)
+
+
+def split_lexemes(text: str) -> list:
+    lexemes = LEXEME_PATTERN.findall(text)
+    if lexemes and not lexemes[-1]:
+        lexemes.pop()  # the blanks at the end of text
+    return lexemes
+
+
+IDENTIFIER_START = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+DIGITS = frozenset('0123456789')
+
+
+class FastScanner(Scanner):
+    """
+        Produces the same tokens as Scanner, but lets a single compiled regex split the source into lexemes
+        instead of stepping through it one character at a time
+    """
+
+    def scan_tokens(self):
+        # tokens never form reference cycles, so the cyclic garbage collector has nothing to find while
+        # hundreds of thousands of them are allocated
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.scan_lexemes(split_lexemes(self.source), self.source, self.tokens.append)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        self.current = len(self.source)
+        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
+        return self.tokens
+
+    def scan_lexemes(self, lexemes: list, source: str, append):
+        """ Turns the lexemes matched in source into tokens, passing each one to append """
+        fixed = self.fixed_lexemes
+        identifier = TokenType.IDENTIFIER
+        line = self.line
+
+        for text in lexemes:
+            token_type = fixed.get(text)
+            if token_type is not None:
+                append(Token(token_type, text, None, line))
+                continue
+
+            c = text[0]
+            if c == '\n':
+                line += len(text)
+            elif c in IDENTIFIER_START:
+                append(Token(identifier, text, None, line))
+            elif c in DIGITS:
+                append(Token(TokenType.NUMBER, text, float(text), line))
+            elif c == '"':
+                if len(text) == 1:
+                    # a quote with no closing quote after it must be the last one in the source
+                    line += source.count('\n', source.rfind('"'))
+                    self.interpreter.pylox_error(line, 'Unterminated string')
+                    self.line = line
+                    return False
+                line += text.count('\n')
+                append(Token(TokenType.STRING, text, text[1:-1], line))
+            elif text.startswith('//'):
+                pass
+            else:
+                self.interpreter.pylox_error(line, f'unexpected character: {text}')
+        self.line = line
+        return True
+
+    @property
+    def fixed_lexemes(self):
+        """ Lexemes that always produce the same token type: operators and keywords """
+        return {**OPERATORS, **self.keywords}
+
+
+class StreamingScanner(FastScanner):
+    """
+        Reads the source from a file object (or mmap) in chunks and yields tokens as they are scanned,
+        so neither the whole source nor the whole token list is ever held in memory
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream, interpreter, chunk_size: int = CHUNK_SIZE):
+        super().__init__('', interpreter)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.token_count = 0  # tokens yielded so far, EOF included
+
+    def scan_tokens(self):
+        return list(self.stream_tokens())
+
+    def stream_tokens(self):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        pending = ''
+        at_end = False
+        while not at_end:
+            data = self.stream.read(self.chunk_size)
+            at_end = not data
+            if isinstance(data, bytes):  # binary files and mmaps
+                data = decoder.decode(data, final=at_end)
+            pending += data
+
+            # only lines that are complete can be scanned, a lexeme never spans a newline unless it is a string
+            cut = len(pending) if at_end else pending.rfind('\n') + 1
+            if not cut:
+                continue
+            text = pending[:cut]
+            lexemes = split_lexemes(text)
+            if not at_end and '"' in lexemes:
+                # a string is still open at the cut, its quote is the last one in the text since nothing closes it
+                # everything from there on is kept until the rest of the string has been read
+                del lexemes[lexemes.index('"'):]
+                cut = text.rfind('"')
+                text = text[:cut]
+            pending = pending[cut:]
+
+            tokens = []
+            if not self.scan_lexemes(lexemes, text, tokens.append):
+                at_end = True
+            self.token_count += len(tokens)
+            yield from tokens
+        self.token_count += 1
+        yield Token(TokenType.EOF, "", None, self.line)
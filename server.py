@@ -0,0 +1,165 @@
+import contextlib
+import io
+import json
+import os
+import socketserver
+import stat
+import sys
+import time
+from interpreter import MAX_CALL_DEPTH
+from main import Lox, ENGINES
+from runtime_error import LoxRuntimeError
+from governor import Limits, ResourceLimitError
+
+# Keeps one warm process that runs lox scripts sent to it, one JSON object per line each way
+# request:  {"id": any, "source": "lox code"} or {"id": any, "path": "script.lox"},
+#           optional "engine" (default: the server's), "stats": true for the --stats metrics of the run and
+#           "limits": {"steps": n, "timeout": seconds, "allocations": n, "memory": bytes} (default: the server's)
+# response: {"id": ..., "status": "ok" | "compile_error" | "runtime_error" | "limit_exceeded" | "bad_request" |
+#            "internal_error", "output": printed text, "errors": [messages], "seconds": run time,
+#            "stats": {...} when asked, "usage": {...} what the run consumed, when it had limits}
+
+
+class ServerLox(Lox):
+    """ Lox that collects its error messages for the response instead of printing them """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.errors = []
+        self.limit_exceeded = False
+
+    def pylox_error(self, line_no: int, message: str) -> None:
+        self.had_error = True
+        self.metrics.count('compile_errors')
+        self.errors.append(f'[line {line_no}] Error: {message}')
+
+    def runtime_error(self, error: LoxRuntimeError) -> None:
+        self.had_runtime_error = True
+        self.limit_exceeded = isinstance(error, ResourceLimitError)
+        self.metrics.count('runtime_errors')
+        self.errors.append(error.message + f'[line {error.operator.line}]')
+
+
+def run_script(source: str, engine: str = 'tree', max_call_depth: int = MAX_CALL_DEPTH, stats: bool = False,
+               limits: Limits | None = None) -> dict:
+    """ Runs source on a new ServerLox and returns its status, output, errors and run time """
+    lox = ServerLox(engine, max_call_depth=max_call_depth, stats=stats, limits=limits)
+    output = io.StringIO()
+    result = {}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            lox.run(source)
+    except Exception as error:  # a bug in the interpreter fails this script only, not the server or batch running it
+        result['status'] = 'internal_error'
+        lox.errors.append(f'{error.__class__.__name__}: {error}')
+    else:
+        if lox.had_error:
+            result['status'] = 'compile_error'
+        elif lox.limit_exceeded:
+            result['status'] = 'limit_exceeded'
+        elif lox.had_runtime_error:
+            result['status'] = 'runtime_error'
+        else:
+            result['status'] = 'ok'
+    result['seconds'] = time.perf_counter() - start
+    result['output'] = output.getvalue()
+    result['errors'] = lox.errors
+    if stats:
+        result['stats'] = lox.metrics.to_dict()
+    if lox.governor is not None:
+        result['usage'] = lox.governor.usage()
+    return result
+
+
+# types each limit may have in a request, the last one is named in the error
+LIMIT_TYPES = {'steps': (int,), 'timeout': (int, float), 'allocations': (int,), 'memory': (int,)}
+
+
+def parse_limits(value) -> Limits:
+    """ Limits from the "limits" object of a request, raises ValueError when it is not a valid one """
+    if not isinstance(value, dict) or not set(value) <= LIMIT_TYPES.keys():
+        raise ValueError('"limits" takes "steps", "timeout", "allocations" and "memory"')
+    for name, limit in value.items():
+        # bool is an int in python, but true is no number of steps
+        if limit is not None and (isinstance(limit, bool) or not isinstance(limit, LIMIT_TYPES[name]) or limit < 0):
+            raise ValueError(f'"limits" "{name}" must be a non-negative {LIMIT_TYPES[name][-1].__name__} or null')
+    return Limits(**value)
+
+
+class LoxServer:
+    """
+        Runs each request on a new ServerLox, so no globals, classes or errors carry over from one script to the next
+        Only the python process and its imported modules are shared. Requests run one at a time, since print
+        output is captured by swapping sys.stdout
+    """
+
+    def __init__(self, engine: str = 'tree', max_call_depth: int = MAX_CALL_DEPTH, limits: Limits | None = None):
+        self.engine = engine
+        self.max_call_depth = max_call_depth
+        self.limits = limits
+
+    def handle(self, line: str) -> dict:
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            return {'id': None, 'status': 'bad_request', 'output': '', 'errors': [f'Invalid JSON: {error}']}
+        if not isinstance(request, dict):
+            return {'id': None, 'status': 'bad_request', 'output': '', 'errors': ['Request must be a JSON object']}
+        response = {'id': request.get('id'), 'status': 'bad_request', 'output': '', 'errors': []}
+
+        engine = request.get('engine', self.engine)
+        if engine not in ENGINES:
+            response['errors'].append(f'Unknown engine: {engine}')
+            return response
+        source = request.get('source')
+        if source is None and 'path' in request:
+            try:
+                with open(request['path']) as f:
+                    source = f.read()
+            except (OSError, TypeError, ValueError) as error:
+                response['errors'].append(f'Cannot read {request["path"]}: {error}')
+                return response
+        if not isinstance(source, str):
+            response['errors'].append('Request needs a "source" string or a "path"')
+            return response
+
+        limits = self.limits
+        if 'limits' in request:
+            try:
+                limits = parse_limits(request['limits'])
+            except ValueError as error:
+                response['errors'].append(str(error))
+                return response
+        response.update(run_script(source, engine, self.max_call_depth, bool(request.get('stats')), limits))
+        return response
+
+    def serve(self, reader, writer):
+        """ Answers each line read from reader with one line written to writer, until reader is closed """
+        for line in reader:
+            if not line.strip():
+                continue
+            writer.write(json.dumps(self.handle(line)) + '\n')
+            writer.flush()
+
+    def serve_stdio(self):
+        self.serve(sys.stdin, sys.stdout)
+
+    def serve_socket(self, path: str):
+        """ Listens on a unix socket, clients are served one after the other """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve(io.TextIOWrapper(self.rfile, encoding='utf-8'),
+                             io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True))
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)  # left over from a server that did not shut down cleanly
+        with socketserver.UnixStreamServer(path, Handler) as unix_server:
+            try:
+                unix_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(path)
@@ -0,0 +1,14 @@
+class Shape:
+    """
+        Field layout shared by every instance of a class that had the same fields added in the same order
+        slots maps a field name to its index in the instance's value list, transitions maps the name of
+        the next field added to the shape that results, so instances built alike end up sharing one shape
+    """
+    __slots__ = ('slots', 'transitions')
+
+    def __init__(self, slots: dict):
+        self.slots = slots
+        self.transitions = {}
+
+    def __repr__(self):
+        return f'<shape {list(self.slots)}>'
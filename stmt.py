@@ -1,119 +1,170 @@
-from expr import Expr, VarExpr
+from expr import Expr, VALIDATE
 from lox_token import Token
 from typing import List
 
+# Generated by tool/generate_ast.py, edit the type descriptions there instead of this file
+
+
 class Stmt:
+	__slots__ = ()
+
 	def accept(self, visitor):
 		raise Exception('accept() method not yet implemented')
 
+
 class FunctionStatement(Stmt):
-	def __init__(self, name: Token, params: List[Token], body: List[Stmt]):
-		assert isinstance(name, Token)
-		assert isinstance(params, list)
-		assert isinstance(body, list)
+	__slots__ = ('name', 'params', 'body', 'impurity', 'callees')
 
+	def __init__(self, name: Token, params: List[Token], body: List[Stmt]):
 		self.name = name
 		self.params = params
 		self.body = body
+		self.impurity = None  # set by the resolver
+		self.callees = None  # set by the resolver
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.name, Token)
+		assert isinstance(self.params, list)
+		assert isinstance(self.body, list)
 
 	def accept(self, visitor):
 		return visitor.visit_function_statement(self)
 
 
 class ClassStatement(Stmt):
-	# def __init__(self, name: Token, super_class: VarExpr, methods: List[FunctionStatement]):
-	def __init__(self, name: Token, methods: List[FunctionStatement]):
-		assert isinstance(name, Token)
-		# assert isinstance(super_class, VarExpr)
-		assert isinstance(methods[0], FunctionStatement)
+	__slots__ = ('name', 'methods')
 
+	def __init__(self, name: Token, methods: List[FunctionStatement]):
 		self.name = name
-		# self.super_class = super_class
 		self.methods = methods
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.name, Token)
+		assert isinstance(self.methods, list)
 
 	def accept(self, visitor):
 		return visitor.visit_class_statement(self)
 
 
 class ReturnStatement(Stmt):
-	def __init__(self, keyword: Token, value: Expr or None):
-		assert isinstance(keyword, Token)
-		if value is not None:
-			assert isinstance(value, Expr)
+	__slots__ = ('keyword', 'value')
 
+	def __init__(self, keyword: Token, value: Expr | None):
 		self.keyword = keyword
 		self.value = value
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.keyword, Token)
+		if self.value is not None:
+			assert isinstance(self.value, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_return_statement(self)
 
 
 class WhileStatement(Stmt):
-	def __init__(self, condition: Expr, body: Stmt):
-		assert isinstance(condition, Expr)
-		assert isinstance(body, Stmt)
+	__slots__ = ('keyword', 'condition', 'body')
 
+	def __init__(self, keyword: Token, condition: Expr, body: Stmt):
+		self.keyword = keyword
 		self.condition = condition
 		self.body = body
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.keyword, Token)
+		assert isinstance(self.condition, Expr)
+		assert isinstance(self.body, Stmt)
 
 	def accept(self, visitor):
 		return visitor.visit_while_statement(self)
 
 
 class ExpressionStatement(Stmt):
-	def __init__(self, expression: Expr):
-		assert isinstance(expression, Expr)
+	__slots__ = ('expression',)
 
+	def __init__(self, expression: Expr):
 		self.expression = expression
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.expression, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_expression_statement(self)
 
 
 class PrintStatement(Stmt):
-	def __init__(self, expression: Expr):
-		assert isinstance(expression, Expr)
+	__slots__ = ('expression',)
 
+	def __init__(self, expression: Expr):
 		self.expression = expression
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.expression, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_print_statement(self)
 
 
 class VarStatement(Stmt):
-	def __init__(self, name: Token, initializer: Expr):
-		assert isinstance(name, Token)
-		if initializer is not None:
-			assert isinstance(initializer, Expr)
+	__slots__ = ('name', 'initializer')
 
+	def __init__(self, name: Token, initializer: Expr | None):
 		self.name = name
 		self.initializer = initializer
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.name, Token)
+		if self.initializer is not None:
+			assert isinstance(self.initializer, Expr)
 
 	def accept(self, visitor):
 		return visitor.visit_var_statement(self)
 
 
 class BlockStatement(Stmt):
-	def __init__(self, statements: List[Stmt]):
-		assert isinstance(statements, list)
+	__slots__ = ('statements',)
 
+	def __init__(self, statements: List[Stmt]):
 		self.statements = statements
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.statements, list)
 
 	def accept(self, visitor):
 		return visitor.visit_block_statement(self)
 
 
 class IfStatement(Stmt):
-	def __init__(self, condition: Expr, then_branch: Stmt, else_branch: Stmt):
-		assert isinstance(condition, Expr)
-		assert isinstance(then_branch, Stmt)
-		if else_branch is not None:
-			assert isinstance(else_branch, Stmt)
+	__slots__ = ('condition', 'then_branch', 'else_branch')
 
+	def __init__(self, condition: Expr, then_branch: Stmt, else_branch: Stmt | None):
 		self.condition = condition
 		self.then_branch = then_branch
 		self.else_branch = else_branch
+		if VALIDATE:
+			self.validate()
+
+	def validate(self):
+		assert isinstance(self.condition, Expr)
+		assert isinstance(self.then_branch, Stmt)
+		if self.else_branch is not None:
+			assert isinstance(self.else_branch, Stmt)
 
 	def accept(self, visitor):
 		return visitor.visit_if_statement(self)
-
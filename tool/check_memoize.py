@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+import sys
+
+# Checks that memoize() refuses functions whose results can change between two calls with the same arguments
+# usage: python3 tool/check_memoize.py
+# Each case runs on every engine, resolved at once as a script and a line at a time as on the prompt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (what the case is about, source, the output of a memoize() that missed it)
+REFUSED = [
+    ('calls an impure function',
+     'var c = 0; fun inc() { c = c + 1; return c; }\n'
+     'fun f(n) { return inc(); }\n'
+     'var m = memoize(f, 10);\n'
+     'print m(1);\n'
+     'print m(1);',
+     '1.0\n1.0\n'),
+    ('calls a global declared again',
+     'fun g() { return 1; }\n'
+     'fun f(n) { return g() + n; }\n'
+     'var m = memoize(f, 10);\n'
+     'print m(1);\n'
+     'fun g() { return 2; }\n'
+     'print m(1);',
+     '2.0\n2.0\n'),
+    ('reads a global assigned after memoize()',
+     'var k = 1;\n'
+     'fun f(n) { return n + k; }\n'
+     'var m = memoize(f, 10);\n'
+     'print m(1);\n'
+     'k = 5;\n'
+     'print m(1);',
+     '2.0\n2.0\n'),
+]
+
+ACCEPTED = [
+    ('replaces itself with its memoized version',
+     'fun fib(n) { if (n < 2) return n; return fib(n - 2) + fib(n - 1); }\n'
+     'fib = memoize(fib, 100);\n'
+     'print fib(60);',
+     '1548008755920.0\n'),
+]
+
+
+def run_script(engine: str, source: str) -> str:
+    from main import Lox
+
+    lox = Lox(engine)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        lox.run(source)
+    return output.getvalue()
+
+
+def run_lines(engine: str, source: str) -> str:
+    from main import Lox
+    from resolver import Resolver
+
+    lox = Lox(engine)
+    lox.resolver = Resolver(lox.interpreter, lox)  # as run_prompt does
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for line in source.splitlines():
+            lox.run(line)
+    return output.getvalue()
+
+
+def main():
+    from main import ENGINES
+
+    failures = 0
+    for engine in ENGINES:
+        for run in (run_script, run_lines):
+            for description, source, stale in REFUSED:
+                output = run(engine, source)
+                if stale in output or 'Cannot memoize f' not in output:
+                    print(f'{engine} {run.__name__}: memoize() accepted a function that {description}:\n{output}')
+                    failures += 1
+            for description, source, expected in ACCEPTED:
+                output = run(engine, source)
+                if output != expected:
+                    print(f'{engine} {run.__name__}: memoize() refused a function that {description}:\n{output}')
+                    failures += 1
+    if failures:
+        sys.exit(1)
+    print('memoize() checks passed')
+
+
+if __name__ == '__main__':
+    main()
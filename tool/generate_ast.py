@@ -5,53 +5,132 @@ import sys
 # This file is not actually used in the interpreter, it just outputs classes into a convenient file
 # Used to create expr.py, stmt.py
 
+# Field types ending in ' | None' are optional
+# Classes listed in RESOLVED_TYPES also get the depth/slot attributes filled in by the resolver
+# Classes listed in CACHED_TYPES also get the attributes of a per call site inline cache, filled in by the interpreter
+# Classes listed in ANALYZED_TYPES also get the attributes of facts the resolver found out about them
+
+EXPR_TYPES = {
+    'ThisExpr': [['Token', 'keyword']],
+    'CallExpr': [['Expr', 'callee'], ['Token', 'paren'], ['List[Expr]', 'arguments']],
+    'GetExpr': [['Expr', 'object'], ['Token', 'name']],
+    'SetExpr': [['Expr', 'object'], ['Token', 'name'], ['Expr', 'value']],
+    'LogicalExpr': [['Expr', 'left'], ['Token', 'operator'], ['Expr', 'right']],
+    'VarExpr': [['Token', 'name']],
+    'AssignExpr': [['Token', 'name'], ['Expr', 'value']],
+    'Binary': [['Expr', 'left'], ['Token', 'operator'], ['Expr', 'right']],
+    'Grouping': [['Expr', 'expression']],
+    'Literal': [['object', 'value']],
+    'Unary': [['Token', 'operator'], ['Expr', 'right']],
+}
+
+STMT_TYPES = {
+    'FunctionStatement': [['Token', 'name'], ['List[Token]', 'params'], ['List[Stmt]', 'body']],
+    'ClassStatement': [['Token', 'name'], ['List[FunctionStatement]', 'methods']],
+    'ReturnStatement': [['Token', 'keyword'], ['Expr | None', 'value']],
+    'WhileStatement': [['Token', 'keyword'], ['Expr', 'condition'], ['Stmt', 'body']],
+    'ExpressionStatement': [['Expr', 'expression']],
+    'PrintStatement': [['Expr', 'expression']],
+    'VarStatement': [['Token', 'name'], ['Expr | None', 'initializer']],
+    'BlockStatement': [['List[Stmt]', 'statements']],
+    'IfStatement': [['Expr', 'condition'], ['Stmt', 'then_branch'], ['Stmt | None', 'else_branch']],
+}
+
+RESOLVED_TYPES = ['ThisExpr', 'VarExpr', 'AssignExpr']
+
+ANALYZED_TYPES = {
+    'FunctionStatement': ['impurity', 'callees'],  # why the function cannot be memoized, None when it can, and
+                                                   # the (name, declaration) of the functions it calls
+}
+
+CACHED_TYPES = {
+    'GetExpr': ['cached_shape', 'cached_index', 'cached_method'],
+    'SetExpr': ['cached_shape', 'cached_index', 'cached_transition'],
+}
+
+
 class GenerateAST:
     def main(self):
         if len(sys.argv) != 1:
             print("Incorrect amount of arguments, usage: generate_ast.py in the working directory")
             sys.exit()
-        print('Creating file...')
-        type_descriptions = {
-            'Expression': [['Expr', 'expression']],
-            'Print': [['Expr', 'expression']]
-        }
-        self.define_ast("stmt", type_descriptions)
-
-        
-    def define_ast(self, base_name, type_descriptions):
-        """ Writes classes to be used in the AST to expr.py """
-        file = base_name + '.py'
-        with open(file, 'x') as f:
-            # f.write('from lox_token import Token\n\n')
-            # f.write('class ExprVisitor:\n')
-            # for class_name in type_descriptions.keys():
-            #     f.write(f'\tdef visit_{class_name.lower()}_{base_name}(self):\n')
-            #     f.write('\t\tpass\n\n')
-
-            f.write(f'class {base_name.capitalize()}:\n')
-            f.write('\t@abstractmethod\n')
-            f.write('\tdef accept(self, visitor: ExprVisitor):\n')
-            f.write('\t\tpass\n\n')
+        print('Creating files...')
+        self.define_ast('expr', 'Expr', 'expr', EXPR_TYPES, [
+            'import os',
+            'from lox_token import Token',
+            'from typing import List',
+        ])
+        self.define_ast('stmt', 'Stmt', 'statement', STMT_TYPES, [
+            'from expr import Expr, VALIDATE',
+            'from lox_token import Token',
+            'from typing import List',
+        ])
+
+    def define_ast(self, file_name, base_name, visitor_suffix, type_descriptions, imports):
+        """ Writes classes to be used in the AST to <file_name>.py """
+        with open(file_name + '.py', 'w') as f:
+            for line in imports:
+                f.write(line + '\n')
+            f.write('\n# Generated by tool/generate_ast.py, edit the type descriptions there instead of this file\n\n')
+            if base_name == 'Expr':
+                f.write('# constructor type checks are costly on large sources, set PYLOX_VALIDATE_AST=1 to run them\n')
+                f.write("VALIDATE = os.environ.get('PYLOX_VALIDATE_AST') == '1'\n\n")
+
+            f.write(f'\nclass {base_name}:\n')
+            f.write('\t__slots__ = ()\n\n')
+            f.write('\tdef accept(self, visitor):\n')
+            f.write("\t\traise Exception('accept() method not yet implemented')\n")
 
             for class_name, class_info in type_descriptions.items():
                 print(f'writing class name = {class_name}')
-                arguments = [f'{info[1]}: {info[0]}' for info in class_info]
-                arg_string = ', '.join(arguments)
-                f.write(f'class {class_name}({base_name.capitalize()}):\n')
-                f.write(f'\tdef __init__(self, {arg_string}):\n')
-                for argument_types in class_info:
-                    f.write(f'\t\tassert isinstance({argument_types[1]}, {argument_types[0]})\n')
-                f.write('\n')
-                for argument_types in class_info:
-                    f.write(f'\t\tself.{argument_types[1]} = {argument_types[1]}\n')
-                f.write('\n')
-
-                f.write('\tdef accept(self, visitor):\n')
-                f.write(f'\t\treturn visitor.visit_{class_name.lower()}_{base_name}(self)\n')
-                f.write('\n')
-
- 
+                self.define_type(f, base_name, visitor_suffix, class_name, class_info)
+
+    def define_type(self, f, base_name, visitor_suffix, class_name, class_info):
+        fields = [info[1] for info in class_info]
+        resolved = class_name in RESOLVED_TYPES
+        analyzed = ANALYZED_TYPES.get(class_name, [])
+        cached = CACHED_TYPES.get(class_name, [])
+        slots = fields + (['depth', 'slot'] if resolved else []) + analyzed + cached
+        arg_string = ', '.join(f'{info[1]}: {info[0]}' for info in class_info)
+
+        slot_string = ', '.join(repr(slot) for slot in slots) + (',' if len(slots) == 1 else '')
+        f.write(f'\n\nclass {class_name}({base_name}):\n')
+        f.write(f'\t__slots__ = ({slot_string})\n\n')
+
+        f.write(f'\tdef __init__(self, {arg_string}):\n')
+        for field in fields:
+            f.write(f'\t\tself.{field} = {field}\n')
+        if resolved:
+            f.write('\t\tself.depth = None  # set by the resolver for locals, None means global\n')
+            f.write('\t\tself.slot = None\n')
+        for attribute in analyzed:
+            f.write(f'\t\tself.{attribute} = None  # set by the resolver\n')
+        for attribute in cached:
+            f.write(f'\t\tself.{attribute} = None  # inline cache, set by the interpreter\n')
+        f.write('\t\tif VALIDATE:\n')
+        f.write('\t\t\tself.validate()\n\n')
+
+        f.write('\tdef validate(self):\n')
+        checks = 0
+        for field_type, field in class_info:
+            optional = field_type.endswith(' | None')
+            field_type = field_type.removesuffix(' | None')
+            if field_type == 'object':
+                continue
+            check_type = 'list' if field_type.startswith('List[') else field_type
+            if optional:
+                f.write(f'\t\tif self.{field} is not None:\n\t')
+            f.write(f'\t\tassert isinstance(self.{field}, {check_type})\n')
+            checks += 1
+        if not checks:
+            f.write('\t\tpass\n')
+        f.write('\n')
+
+        visitor_name = class_name.removesuffix(base_name).removesuffix('Statement').lower()
+        f.write('\tdef accept(self, visitor):\n')
+        f.write(f'\t\treturn visitor.visit_{visitor_name}_{visitor_suffix}(self)\n')
+
+
 if __name__ == '__main__':
     gen_ast = GenerateAST()
     gen_ast.main()
-
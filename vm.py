@@ -0,0 +1,503 @@
+from typing import List
+from bytecode import OpCode
+from compiler import Compiler, FunctionProto
+from environment import Environment
+from interpreter import Interpreter
+from lox_callable import LoxCallable
+from lox_class import LoxClass
+from lox_instance import LoxInstance
+from lox_collections import COLLECTIONS
+from lox_token import Token, TokenType
+from natives import NativeFunction
+from runtime_error import LoxRuntimeError
+from stmt import Stmt
+
+
+class VMFunction(LoxCallable):
+    """ A compiled function closed over the environment it was declared in """
+
+    def __init__(self, proto: FunctionProto, closure: Environment, is_initializer: bool):
+        self.proto = proto
+        self.closure = closure
+        self.is_initializer = is_initializer
+
+    def call(self, interpreter, arguments: list):
+        return interpreter.run(self, arguments)
+
+    def arity(self):
+        return len(self.proto.params)
+
+    def bind(self, instance):
+        return VMFunction(self.proto, Environment(self.closure, [instance]), self.is_initializer)
+
+    def __str__(self):
+        return f'<fn {self.proto.name}>'
+
+
+class VirtualMachine(Interpreter):
+    """ Compiles programs to bytecode and runs them on a stack machine """
+
+    def interpret(self, statements: List[Stmt]):
+        script = Compiler(self).compile_script(statements)
+        try:
+            self.execute_frame(script, self.globals)
+        except LoxRuntimeError as e:
+            self.main.runtime_error(e)
+
+    def run(self, function: VMFunction, arguments: list):
+        """ Runs a function to completion, used when a function is called from outside the dispatch loop """
+        result = self.execute_frame(function.proto, Environment(function.closure, list(arguments)))
+        if function.is_initializer:
+            return function.closure.get_at(0, 0)
+        return result
+
+    def error(self, chunk, ip: int, message: str):
+        return LoxRuntimeError(self.token(chunk, ip), message)
+
+    def token(self, chunk, ip: int) -> Token:
+        # ip points past the failing instruction, any of its words map to the same line
+        return Token(TokenType.EOF, '', None, chunk.get_line(ip - 1))
+
+    def call_native(self, chunk, ip: int, callee: LoxCallable, arguments: list, depth: int):
+        """
+            Calls a class or native through call(), depth is the number of lox frames below the call
+            A callee that runs lox code again, like a memoized function, enters execute_frame with call_depth
+            set past those frames, so the depth limit holds across the nested runs
+        """
+        if depth >= self.max_call_depth:
+            raise self.error(chunk, ip, 'Stack overflow')
+        call_depth = self.call_depth
+        self.call_depth = depth + 1
+        try:
+            return callee.call(self, arguments)
+        except LoxRuntimeError as error:
+            if error.operator is None:
+                error.operator = self.token(chunk, ip)
+            raise
+        finally:
+            self.call_depth = call_depth
+
+    def collection_method(self, chunk, ip: int, collection, key: str) -> NativeFunction:
+        method = collection.methods.get(key)
+        if method is None:
+            raise self.error(chunk, ip, f'Undefined property: {key}')
+        return method
+
+    def execute_frame(self, proto: FunctionProto, env: Environment):
+        CONSTANT = OpCode.CONSTANT.value
+        NIL = OpCode.NIL.value
+        TRUE = OpCode.TRUE.value
+        FALSE = OpCode.FALSE.value
+        POP = OpCode.POP.value
+        GET_LOCAL = OpCode.GET_LOCAL.value
+        SET_LOCAL = OpCode.SET_LOCAL.value
+        SET_LOCAL_POP = OpCode.SET_LOCAL_POP.value
+        GET_GLOBAL = OpCode.GET_GLOBAL.value
+        SET_GLOBAL = OpCode.SET_GLOBAL.value
+        SET_GLOBAL_POP = OpCode.SET_GLOBAL_POP.value
+        DEFINE = OpCode.DEFINE.value
+        DEFINE_LOCAL = OpCode.DEFINE_LOCAL.value
+        GET_PROPERTY = OpCode.GET_PROPERTY.value
+        SET_PROPERTY = OpCode.SET_PROPERTY.value
+        EQUAL = OpCode.EQUAL.value
+        NOT_EQUAL = OpCode.NOT_EQUAL.value
+        GREATER = OpCode.GREATER.value
+        GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+        LESS = OpCode.LESS.value
+        LESS_EQUAL = OpCode.LESS_EQUAL.value
+        ADD = OpCode.ADD.value
+        SUBTRACT = OpCode.SUBTRACT.value
+        MULTIPLY = OpCode.MULTIPLY.value
+        DIVIDE = OpCode.DIVIDE.value
+        NOT = OpCode.NOT.value
+        NEGATE = OpCode.NEGATE.value
+        PRINT = OpCode.PRINT.value
+        JUMP = OpCode.JUMP.value
+        LOOP = OpCode.LOOP.value
+        POP_JUMP_IF_FALSE = OpCode.POP_JUMP_IF_FALSE.value
+        JUMP_IF_FALSE_OR_POP = OpCode.JUMP_IF_FALSE_OR_POP.value
+        JUMP_IF_TRUE_OR_POP = OpCode.JUMP_IF_TRUE_OR_POP.value
+        CALL = OpCode.CALL.value
+        FUNCTION = OpCode.FUNCTION.value
+        CLASS = OpCode.CLASS.value
+        RETURN = OpCode.RETURN.value
+        PUSH_ENV = OpCode.PUSH_ENV.value
+        POP_ENV = OpCode.POP_ENV.value
+        LOAD_METHOD = OpCode.LOAD_METHOD.value
+        CALL_METHOD = OpCode.CALL_METHOD.value
+
+        globals = self.globals.values
+        is_equal = self.is_equal
+        # lox frames left to this run, the frames of the runs it was entered from through natives count too
+        base_depth = self.call_depth
+        max_frames = self.max_call_depth - base_depth
+        # the limit countdown and call count are kept in locals and only stored back in self when something outside
+        # the loop may read them: the governor, a nested run entered through call_native, or the caller on the way out
+        countdown = self.countdown
+        calls = self.calls
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        frames = []  # saved (function, chunk, ip, env) of the callers
+        function = None  # the VMFunction being run, None for scripts and functions entered through run()
+        chunk = proto.chunk
+        code = chunk.code
+        constants = chunk.constants
+        ip = 0
+
+        # the branches are ordered by how often their instructions run in benchmarks/suite.py, most frequent first
+        try:
+            while True:
+                op = code[ip]
+                ip += 1
+
+                if op == GET_LOCAL:
+                    distance = code[ip]
+                    slot = code[ip + 1]
+                    ip += 2
+                    environment = env
+                    while distance:
+                        environment = environment.enclosing
+                        distance -= 1
+                    push(environment.values[slot])
+                elif op == CONSTANT:
+                    push(constants[code[ip]])
+                    ip += 1
+                elif op == ADD:
+                    b = pop()
+                    a = stack[-1]
+                    kind = a.__class__
+                    if (kind is float or kind is str) and b.__class__ is kind:
+                        stack[-1] = a + b
+                    else:
+                        raise self.error(chunk, ip, f"Operands must be matching strings or numbers, left={a} {type(a)}, right={b} {type(b)}")
+                elif op == GET_GLOBAL:
+                    key = constants[code[ip]]
+                    ip += 1
+                    if key not in globals:
+                        raise self.error(chunk, ip, f'Undefined variable: {key}')
+                    push(globals[key])
+                elif op == POP:
+                    pop()
+                elif op == PUSH_ENV:
+                    env = Environment(env)
+                elif op == POP_ENV:
+                    env = env.enclosing
+                elif op == POP_JUMP_IF_FALSE:
+                    value = pop()
+                    if value is None or value is False:
+                        ip = code[ip]
+                    else:
+                        ip += 1
+                elif op == LESS:
+                    b = pop()
+                    stack[-1] = stack[-1] < b
+                elif op == CALL:
+                    argc = code[ip]
+                    ip += 1
+                    calls += 1
+                    countdown -= 1
+                    if not countdown:
+                        self.check_limits(Token(TokenType.EOF, '', None, chunk.get_line(ip - 1)))
+                        countdown = self.countdown
+                    callee = stack[-1 - argc]
+                    if callee.__class__ is VMFunction:
+                        if argc != len(callee.proto.params):
+                            raise self.error(chunk, ip, f'Expected {len(callee.proto.params)} arguments but got {argc}')
+                    elif callee.__class__ is LoxClass:
+                        # the arity was checked against the class, the initializer runs in a frame like any other call
+                        if argc != callee.arity():
+                            raise self.error(chunk, ip, f'Expected {callee.arity()} arguments but got {argc}')
+                        instance = LoxInstance(callee)
+                        initializer = callee.find_method('init')
+                        if initializer is None:
+                            del stack[-1 - argc:]
+                            push(instance)
+                            continue
+                        callee = initializer.bind(instance)
+
+                    if callee.__class__ is VMFunction:
+                        environment = Environment(callee.closure, stack[len(stack) - argc:])
+                        del stack[-1 - argc:]
+                        if code[ip] != RETURN:
+                            if len(frames) >= max_frames:
+                                raise self.error(chunk, ip, 'Stack overflow')
+                            frames.append((function, chunk, ip, env))
+                        # else the call is in tail position, the callee takes over this frame instead of nesting
+                        function = callee
+                        chunk = callee.proto.chunk
+                        code = chunk.code
+                        constants = chunk.constants
+                        ip = 0
+                        env = environment
+                    elif callee.__class__ is NativeFunction:
+                        if argc != callee.parameter_count:
+                            raise self.error(chunk, ip, f'Expected {callee.parameter_count} arguments but got {argc}')
+                        arguments = stack[len(stack) - argc:]
+                        del stack[-1 - argc:]
+                        try:
+                            push(callee.function(*arguments))
+                        except LoxRuntimeError as error:
+                            if error.operator is None:
+                                error.operator = self.token(chunk, ip)
+                            raise
+                    elif isinstance(callee, LoxCallable):
+                        arguments = stack[len(stack) - argc:]
+                        if argc != callee.arity():
+                            raise self.error(chunk, ip, f'Expected {callee.arity()} arguments but got {argc}')
+                        del stack[-1 - argc:]
+                        self.countdown = countdown
+                        self.calls = calls
+                        try:
+                            push(self.call_native(chunk, ip, callee, arguments, base_depth + len(frames)))
+                        finally:
+                            countdown = self.countdown
+                            calls = self.calls
+                    else:
+                        raise self.error(chunk, ip, 'Can only call functions and classes')
+                elif op == SET_LOCAL_POP:
+                    distance = code[ip]
+                    slot = code[ip + 1]
+                    ip += 2
+                    environment = env
+                    while distance:
+                        environment = environment.enclosing
+                        distance -= 1
+                    environment.values[slot] = pop()
+                elif op == SET_LOCAL:
+                    distance = code[ip]
+                    slot = code[ip + 1]
+                    ip += 2
+                    environment = env
+                    while distance:
+                        environment = environment.enclosing
+                        distance -= 1
+                    environment.values[slot] = stack[-1]
+                elif op == LOOP:
+                    countdown -= 1
+                    if not countdown:
+                        self.check_limits(Token(TokenType.EOF, '', None, chunk.get_line(ip)))
+                        countdown = self.countdown
+                    ip = code[ip]
+                elif op == SET_GLOBAL_POP:
+                    key = constants[code[ip]]
+                    ip += 1
+                    if key not in globals:
+                        raise self.error(chunk, ip, f'Undefined variable: {key}')
+                    globals[key] = pop()
+                elif op == SET_GLOBAL:
+                    key = constants[code[ip]]
+                    ip += 1
+                    if key not in globals:
+                        raise self.error(chunk, ip, f'Undefined variable: {key}')
+                    globals[key] = stack[-1]
+                elif op == RETURN:
+                    result = pop()
+                    if function is not None and function.is_initializer:
+                        result = function.closure.get_at(0, 0)  # force return of 'this' for class initializers
+                    if not frames:
+                        return result
+                    function, chunk, ip, env = frames.pop()
+                    code = chunk.code
+                    constants = chunk.constants
+                    push(result)
+                elif op == DEFINE_LOCAL:
+                    env.values.append(pop())
+                elif op == GET_PROPERTY:
+                    key = constants[code[ip]]
+                    ip += 1
+                    instance = stack[-1]
+                    if not isinstance(instance, LoxInstance):
+                        if isinstance(instance, COLLECTIONS):
+                            stack[-1] = self.collection_method(chunk, ip, instance, key).bind(instance)
+                            continue
+                        raise self.error(chunk, ip, 'Only instances have properties')
+                    shape = instance.shape
+                    index = shape.slots.get(key) if shape is not None else None
+                    if index is not None:
+                        stack[-1] = instance.values[index]
+                    elif shape is None and key in instance.values:
+                        stack[-1] = instance.values[key]
+                    else:
+                        method = instance.lox_class.find_method(key)
+                        if not method:
+                            raise self.error(chunk, ip, f'Undefined property: {key}')
+                        stack[-1] = method.bind(instance)
+                elif op == SUBTRACT:
+                    b = pop()
+                    a = stack[-1]
+                    if not isinstance(a, float) or not isinstance(b, (float, int)):
+                        raise self.error(chunk, ip, 'Operands must be numbers')
+                    stack[-1] = a - b
+                elif op == MULTIPLY:
+                    b = pop()
+                    a = stack[-1]
+                    if not isinstance(a, float) or not isinstance(b, (float, int)):
+                        raise self.error(chunk, ip, 'Operands must be numbers')
+                    stack[-1] = a * b
+                elif op == LOAD_METHOD:
+                    key = constants[code[ip]]
+                    ip += 1
+                    instance = stack[-1]
+                    if not isinstance(instance, LoxInstance):
+                        if instance.__class__ in COLLECTIONS:
+                            # CALL_METHOD calls the method with the list or map as receiver
+                            stack[-1] = self.collection_method(chunk, ip, instance, key)
+                            push(instance)
+                            continue
+                        raise self.error(chunk, ip, 'Only instances have properties')
+                    if instance.has_field(key):
+                        stack[-1] = instance.get_field(key)
+                        push(None)
+                    else:
+                        method = instance.lox_class.find_method(key)
+                        if not method:
+                            raise self.error(chunk, ip, f'Undefined property: {key}')
+                        if method.is_initializer:
+                            # RETURN finds 'this' for initializers through their closure, so they are bound
+                            stack[-1] = method.bind(instance)
+                            push(None)
+                        else:
+                            stack[-1] = method
+                            push(instance)
+                elif op == CALL_METHOD:
+                    argc = code[ip]
+                    ip += 1
+                    calls += 1
+                    countdown -= 1
+                    if not countdown:
+                        self.check_limits(Token(TokenType.EOF, '', None, chunk.get_line(ip - 1)))
+                        countdown = self.countdown
+                    instance = stack[-1 - argc]
+                    if instance is not None:
+                        method = stack[-2 - argc]
+                        if method.__class__ is NativeFunction:
+                            if argc != method.parameter_count:
+                                raise self.error(chunk, ip, f'Expected {method.parameter_count} arguments but got {argc}')
+                            arguments = stack[len(stack) - argc:]
+                            del stack[-2 - argc:]
+                            try:
+                                push(method.function(instance, *arguments))
+                            except LoxRuntimeError as error:
+                                if error.operator is None:
+                                    error.operator = self.token(chunk, ip)
+                                raise
+                            continue
+                        if argc != len(method.proto.params):
+                            raise self.error(chunk, ip, f'Expected {len(method.proto.params)} arguments but got {argc}')
+                        environment = Environment(Environment(method.closure, [instance]), stack[len(stack) - argc:])
+                        del stack[-2 - argc:]
+                        if code[ip] != RETURN:
+                            if len(frames) >= max_frames:
+                                raise self.error(chunk, ip, 'Stack overflow')
+                            frames.append((function, chunk, ip, env))
+                        # else the call is in tail position, the callee takes over this frame instead of nesting
+                        function = method
+                        chunk = method.proto.chunk
+                        code = chunk.code
+                        constants = chunk.constants
+                        ip = 0
+                        env = environment
+                    else:
+                        # a field, or an initializer bound by LOAD_METHOD, is called like a native
+                        callee = stack[-2 - argc]
+                        arguments = stack[len(stack) - argc:]
+                        if not isinstance(callee, LoxCallable):
+                            raise self.error(chunk, ip, 'Can only call functions and classes')
+                        if argc != callee.arity():
+                            raise self.error(chunk, ip, f'Expected {callee.arity()} arguments but got {argc}')
+                        del stack[-2 - argc:]
+                        self.countdown = countdown
+                        self.calls = calls
+                        try:
+                            push(self.call_native(chunk, ip, callee, arguments, base_depth + len(frames)))
+                        finally:
+                            countdown = self.countdown
+                            calls = self.calls
+                elif op == JUMP:
+                    ip = code[ip]
+                elif op == LESS_EQUAL:
+                    b = pop()
+                    stack[-1] = stack[-1] <= b
+                elif op == GREATER:
+                    b = pop()
+                    stack[-1] = stack[-1] > b
+                elif op == GREATER_EQUAL:
+                    b = pop()
+                    stack[-1] = stack[-1] >= b
+                elif op == EQUAL:
+                    b = pop()
+                    stack[-1] = is_equal(stack[-1], b)
+                elif op == NOT_EQUAL:
+                    b = pop()
+                    stack[-1] = not is_equal(stack[-1], b)
+                elif op == DIVIDE:
+                    b = pop()
+                    a = stack[-1]
+                    if not isinstance(a, float) or not isinstance(b, (float, int)):
+                        raise self.error(chunk, ip, 'Operands must be numbers')
+                    stack[-1] = a / b
+                elif op == NIL:
+                    push(None)
+                elif op == TRUE:
+                    push(True)
+                elif op == FALSE:
+                    push(False)
+                elif op == SET_PROPERTY:
+                    key = constants[code[ip]]
+                    ip += 1
+                    value = pop()
+                    instance = stack[-1]
+                    if not isinstance(instance, LoxInstance):
+                        raise self.error(chunk, ip, 'Only instances have fields')
+                    shape = instance.shape
+                    index = shape.slots.get(key) if shape is not None else None
+                    if index is not None:
+                        instance.values[index] = value
+                    else:
+                        instance.set_field(key, value)
+                    stack[-1] = value
+                elif op == JUMP_IF_FALSE_OR_POP:
+                    value = stack[-1]
+                    if value is None or value is False:
+                        ip = code[ip]
+                    else:
+                        pop()
+                        ip += 1
+                elif op == JUMP_IF_TRUE_OR_POP:
+                    value = stack[-1]
+                    if value is not None and value is not False:
+                        ip = code[ip]
+                    else:
+                        pop()
+                        ip += 1
+                elif op == NOT:
+                    stack[-1] = not stack[-1]
+                elif op == NEGATE:
+                    if not isinstance(stack[-1], float):
+                        raise self.error(chunk, ip, 'Operand must be a number')
+                    stack[-1] = -stack[-1]
+                elif op == PRINT:
+                    print(pop(), file=self.output)
+                elif op == DEFINE:
+                    env.define(constants[code[ip]], pop())
+                    ip += 1
+                elif op == FUNCTION:
+                    function_proto = constants[code[ip]]
+                    ip += 1
+                    push(VMFunction(function_proto, env, function_proto.is_initializer))
+                elif op == CLASS:
+                    name = constants[code[ip]]
+                    count = code[ip + 1]
+                    ip += 2
+                    methods = {}
+                    for method in stack[len(stack) - count:]:
+                        methods[method.proto.name] = method
+                    del stack[len(stack) - count:]
+                    env.define(name, LoxClass(name, methods))
+                else:
+                    raise self.error(chunk, ip, f'Unknown opcode {op}')
+        finally:
+            self.countdown = countdown
+            self.calls = calls